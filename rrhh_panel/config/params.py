@@ -7,8 +7,32 @@ from __future__ import annotations
 H_DAYS = 30
 MIN_BASE_KPI = 30
 
+# horizontes (días) de deserción leídos de la misma curva de salidas desde el corte (DS30/DS60/DS90)
+KPI_HORIZONS_DAYS = (30, 60, 90)
+
 DEFAULT_TOPN = 10
 DEFAULT_RANGE_DAYS = 180
 
+# dimensiones de estandarización del KPI (edad/antig se calculan al corte; el resto son columnas
+# categóricas de Historia Personal, p.ej. ("edad", "antig", "sexo", "area_gen"))
+STD_STRATA_DIMS = ("edad", "antig")
+
+# rotación móvil (días): salidas de la ventana / existencias promedio de la ventana
+ROLLING_WINDOWS_DAYS = (90, 365)
+
+# retención por cohorte: n° de meses de ingreso (y de meses desde el ingreso) a mostrar
+COHORT_MONTHS_OPTIONS = (12, 24, 36, 60, 120)
+DEFAULT_COHORT_MONTHS = 24
+
+# modo aproximado (opt-in): fracción de personas muestreadas (por cod, estratificada por
+# APPROX_STRATA_COL en el último evento) y z de las bandas de error (IC 95%)
+APPROX_SAMPLE_FRAC = 0.10
+APPROX_STRATA_COL = "area_gen"
+APPROX_Z = 1.96
+
 # cobertura mínima de pesos (para alertas)
 MIN_COVERAGE_W = 0.60
+
+# caché en disco de Historia Personal preparada (Parquet), con tope de tamaño (LRU)
+PREP_CACHE_DIR = ".rrhh_cache"
+PREP_CACHE_MAX_MB = 1024
@@ -32,8 +32,9 @@ LBL_SNAPSHOT_DATE = "Snapshot (día)"
 LBL_TODAY_CUT = "Hoy (corte)"
 
 # Filtros
-LBL_FILTERS_HINT = "Deja vacío = no filtra (equivale a TODOS)."
+LBL_FILTERS_HINT = "Deja vacío = no filtra (equivale a TODOS). Entre paréntesis: registros que quedan con el resto de filtros."
 BTN_CLEAR_FILTERS = "Limpiar filtros"
+BTN_APPROX_EXACT = "Calcular exacto"
 
 LBL_SEXO = "Sexo"
 LBL_AREA_GEN = "Área General"
@@ -49,7 +50,6 @@ LBL_TENURE_BUCKET = "Antigüedad (bucket)"
 LBL_AGE_BUCKET = "Edad (bucket)"
 
 # Opciones
-LBL_OPT_UNIQUE_DAY = "Salidas: contar personas únicas por día"
 LBL_OPT_SHOW_LABELS = "Mostrar etiquetas de datos"
 LBL_OPT_TOPN = "Top N categorías (barras/pastel)"
 LBL_OPT_DESC_VARS = "Variables descriptivas (dinámico)"
@@ -57,6 +57,16 @@ LBL_OPT_DESC_DATASET = "Dataset descriptivo"
 LBL_OPT_DESC_DATASET_1 = "Existencias (snapshot)"
 LBL_OPT_DESC_DATASET_2 = "Salidas (en rango)"
 LBL_OPT_EXIT_SHARE_VAR = "Salidas como % del total de existencias (elige variable)"
+LBL_OPT_APPROX = "Modo aproximado (muestra de personas + bandas de error; para historias muy grandes)"
+
+# Descriptivos
+LBL_DESC_TAB_MAIN = "Existencias & Salidas"
+LBL_DESC_TAB_COHORTS = "Retención por cohorte"
+LBL_COHORT_MONTHS = "Cohortes (meses de ingreso hasta el fin del rango)"
+
+# Dashboard
+LBL_BREAKDOWN_DIM = "Desglosar por"
+LBL_BREAKDOWN_NONE = "(sin desglose)"
 
 # Mensajes
 MSG_NEED_DATA = "Carga datos y define rango/filtros para ver el panel."
@@ -64,3 +74,5 @@ MSG_LOAD_FILE_TO_START = "Carga un archivo para iniciar."
 MSG_PATH_NOT_FOUND = "La ruta no existe."
 MSG_READ_FAIL = "No se pudo leer el archivo:"
 MSG_NO_DATA_FOR_VIEW = "No hay datos suficientes con los filtros actuales."
+MSG_APPROX_ON = "Modo aproximado: estimaciones sobre una muestra de {pct} de las personas ({n} de {N}); barras = IC 95%."
+MSG_APPROX_EXACT = "Resultados exactos para la selección actual (al cambiar filtros se vuelve al modo aproximado)."
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from dataclasses import fields
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from rrhh_panel.config.params import PREP_CACHE_DIR, PREP_CACHE_MAX_MB
+from rrhh_panel.schema.historia_personal import SCHEMA_VERSION
+from rrhh_panel.preprocessing.intervals import IntervalIndex, build_interval_index
+from rrhh_panel.utils.dates import today_dt
+
+# =============================================================================
+# Caché en disco: Historia Personal preparada + intervalos (Parquet / .npy)
+# =============================================================================
+_ARRAY_FIELDS = [f.name for f in fields(IntervalIndex) if f.name not in ("events", "intervals", "fingerprint")]
+
+# errores de una entrada ilegible (archivos truncados/borrados, Parquet o meta.json corruptos)
+CACHE_LOAD_ERRORS = (OSError, ValueError, KeyError, pa.ArrowInvalid)
+
+def content_hash(file_obj_or_path) -> str:
+    h = hashlib.sha256()
+    if isinstance(file_obj_or_path, (str, os.PathLike)):
+        with open(file_obj_or_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    else:
+        pos = file_obj_or_path.tell()
+        file_obj_or_path.seek(0)
+        for chunk in iter(lambda: file_obj_or_path.read(1 << 20), b""):
+            h.update(chunk)
+        file_obj_or_path.seek(pos)
+    return h.hexdigest()
+
+def prepared_cache_key(file_hash: str, sheet_name: str | None) -> str:
+    raw = f"{file_hash}|{sheet_name or ''}|v{SCHEMA_VERSION}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _entry_dir(key: str, cache_dir: str = PREP_CACHE_DIR) -> str:
+    return os.path.join(cache_dir, key)
+
+def has_prepared(key: str, cache_dir: str = PREP_CACHE_DIR) -> bool:
+    return os.path.exists(os.path.join(_entry_dir(key, cache_dir), "meta.json"))
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def load_prepared_index(key: str, today: str, cache_dir: str = PREP_CACHE_DIR) -> IntervalIndex:
+    d = _entry_dir(key, cache_dir)
+    with open(os.path.join(d, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    os.utime(d)  # LRU: último uso = mtime del directorio
+    events = pd.read_parquet(os.path.join(d, "events.parquet"), memory_map=True)
+
+    # fin_eff depende de "hoy": si la entrada es de otro día, se recalcula (la fusión es barata)
+    # y se reescribe en disco para que las próximas cargas del día vayan directo a los .npy
+    if meta.get("today") != today:
+        events["fin_eff"] = events["fin"].fillna(pd.Timestamp(today))
+        ix = build_interval_index(events)
+        try:
+            save_prepared_index(key, ix, cache_dir, today=today, overwrite=True)
+        except OSError:
+            pass  # sin escritura: la entrada vieja sigue sirviendo (se recalcula en cada carga)
+        return ix
+
+    intervals = pd.read_parquet(os.path.join(d, "intervals.parquet"), memory_map=True)
+    arrays = {name: np.load(os.path.join(d, f"{name}.npy"), mmap_mode="r") for name in _ARRAY_FIELDS}
+    return IntervalIndex(events=events, intervals=intervals, fingerprint=meta["fingerprint"], **arrays)
+
+def save_prepared_index(
+    key: str,
+    ix: IntervalIndex,
+    cache_dir: str = PREP_CACHE_DIR,
+    max_mb: float = PREP_CACHE_MAX_MB,
+    today: str | None = None,
+    overwrite: bool = False,
+) -> None:
+    # escritura atómica: directorio temporal + rename (overwrite: reemplaza una entrada existente)
+    os.makedirs(cache_dir, exist_ok=True)
+    final = _entry_dir(key, cache_dir)
+    if os.path.exists(final) and not overwrite:
+        return
+    tmp = os.path.join(cache_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp)
+    try:
+        ix.events.to_parquet(os.path.join(tmp, "events.parquet"), index=False)
+        ix.intervals.to_parquet(os.path.join(tmp, "intervals.parquet"), index=False)
+        for name in _ARRAY_FIELDS:
+            np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(ix, name)))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "fingerprint": ix.fingerprint,
+                "schema_version": SCHEMA_VERSION,
+                "today": today or str(today_dt().date()),
+            }, f)
+        if os.path.exists(final):
+            old = os.path.join(cache_dir, f".tmp-{uuid.uuid4().hex}")
+            os.replace(final, old)
+            shutil.rmtree(old, ignore_errors=True)
+        os.replace(tmp, final)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    evict_lru(cache_dir, max_mb)
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(path) for f in fs)
+
+def evict_lru(cache_dir: str = PREP_CACHE_DIR, max_mb: float = PREP_CACHE_MAX_MB) -> None:
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        p = os.path.join(cache_dir, name)
+        if os.path.isdir(p) and not name.startswith(".tmp-"):
+            entries.append((os.path.getmtime(p), _dir_size(p), p))
+
+    total = sum(e[1] for e in entries)
+    limit = float(max_mb) * 1024 * 1024
+    for _, size, p in sorted(entries):
+        if total <= limit:
+            break
+        shutil.rmtree(p, ignore_errors=True)
+        total -= size
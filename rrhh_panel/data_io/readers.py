@@ -1,21 +1,150 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import List
 import pandas as pd
+from openpyxl import load_workbook
 
-from rrhh_panel.schema.historia_personal import REQUIRED_COLS, R_COL_CANDIDATES
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # sin pyarrow: motor C de pandas
+    pa = None
+    pa_csv = None
+
+from rrhh_panel.schema.historia_personal import REQUIRED_COLS, R_COL_CANDIDATES, DATE_COLS, DIM_RAW_COLS
+
+_XLSX_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+def _rewind(file_obj_or_path) -> None:
+    if hasattr(file_obj_or_path, "seek"):
+        file_obj_or_path.seek(0)
+
+def list_excel_sheets(file_obj_or_path) -> List[str]:
+    # xlsx: nombres de hoja desde xl/workbook.xml, sin parsear celdas
+    _rewind(file_obj_or_path)
+    if not zipfile.is_zipfile(file_obj_or_path):
+        _rewind(file_obj_or_path)
+        return pd.ExcelFile(file_obj_or_path).sheet_names
+    _rewind(file_obj_or_path)
+    with zipfile.ZipFile(file_obj_or_path) as zf:
+        root = ET.fromstring(zf.read("xl/workbook.xml"))
+    _rewind(file_obj_or_path)
+    return [s.get("name") for s in root.iterfind("m:sheets/m:sheet", _XLSX_NS)]
 
 def read_excel_any(file_obj_or_path, sheet_name: str) -> pd.DataFrame:
     return pd.read_excel(file_obj_or_path, sheet_name=sheet_name)
 
+def _excel_cell(v):
+    # mismo criterio que pandas/openpyxl: float entero -> int
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
 def read_excel_strict_hist(file_obj_or_path, sheet_name: str) -> pd.DataFrame:
-    df = pd.read_excel(file_obj_or_path, sheet_name=sheet_name)
-    cols = list(df.columns)
+    _rewind(file_obj_or_path)
+    if not zipfile.is_zipfile(file_obj_or_path):
+        _rewind(file_obj_or_path)
+        df = pd.read_excel(file_obj_or_path, sheet_name=sheet_name)
+        cols = list(df.columns)
+        r_col = next((c for c in cols if str(c).strip() in R_COL_CANDIDATES), None)
+        keep = [c for c in REQUIRED_COLS if c in cols]
+        if r_col and r_col not in keep:
+            keep.append(r_col)
+        return df[keep].copy() if keep else df.copy()
+
+    _rewind(file_obj_or_path)
+    wb = load_workbook(file_obj_or_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+
+        # 1) cabecera: resolver columnas requeridas + %R
+        header = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), None) or ()
+        names = [("" if h is None else str(h)) for h in header]
+        pos = {}
+        for i, h in enumerate(names):
+            pos.setdefault(h, i)
+        r_col = next((h for h in names if h.strip() in R_COL_CANDIDATES), None)
+        keep = [c for c in REQUIRED_COLS if c in pos]
+        if r_col and r_col not in keep:
+            keep.append(r_col)
+        c0 = min((pos[c] for c in keep), default=0)
+        c1 = max((pos[c] for c in keep), default=0)
+        idx = [pos[c] - c0 for c in keep]
+
+        # 2) una pasada en streaming, sólo el rango de columnas necesario
+        data = [[] for _ in keep]
+        for row in ws.iter_rows(min_row=2, min_col=c0 + 1, max_col=c1 + 1, values_only=True):
+            if row is None:
+                continue
+            vals = [row[i] if i < len(row) else None for i in idx]
+            if all(v is None for v in vals):
+                continue
+            for j, v in enumerate(vals):
+                data[j].append(_excel_cell(v))
+    finally:
+        wb.close()
+        _rewind(file_obj_or_path)
+
+    # 3) dtypes explícitos: fechas a datetime64, texto a string, %R tal cual
+    out = {}
+    for c, vals in zip(keep, data):
+        s = pd.Series(vals, dtype="object")
+        if c in DATE_COLS:
+            s = pd.to_datetime(s, errors="coerce")
+        elif c != r_col:
+            s = s.astype("string")
+        out[c] = s
+    return pd.DataFrame(out, columns=keep)
+
+def read_csv_strict_hist(file_obj_or_path) -> pd.DataFrame:
+    # 1) cabecera: columnas del contrato + %R
+    _rewind(file_obj_or_path)
+    cols = list(pd.read_csv(file_obj_or_path, nrows=0).columns)
+    _rewind(file_obj_or_path)
     r_col = next((c for c in cols if str(c).strip() in R_COL_CANDIDATES), None)
     keep = [c for c in REQUIRED_COLS if c in cols]
     if r_col and r_col not in keep:
         keep.append(r_col)
-    return df[keep].copy() if keep else df.copy()
+    if not keep:
+        return pd.DataFrame(columns=cols)
+
+    # 2) lectura tipada: texto como string (sin perder ceros a la izquierda), dimensiones como category
+    dim_cols = [c for c in keep if c in DIM_RAW_COLS]
+    str_cols = [c for c in keep if c not in dim_cols]
+    if pa_csv is not None:
+        try:
+            table = pa_csv.read_csv(
+                file_obj_or_path,
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=keep,
+                    column_types={
+                        **{c: pa.string() for c in str_cols},
+                        **{c: pa.dictionary(pa.int32(), pa.string()) for c in dim_cols},
+                    },
+                    strings_can_be_null=True,
+                ),
+            )
+            df = table.to_pandas(types_mapper={pa.string(): pd.StringDtype()}.get)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            df = None  # CSV que pyarrow no entiende: motor C de pandas
+        finally:
+            _rewind(file_obj_or_path)
+    else:
+        df = None
+
+    if df is None:
+        df = pd.read_csv(
+            file_obj_or_path,
+            usecols=keep,
+            dtype={**{c: "string" for c in str_cols}, **{c: "category" for c in dim_cols}},
+        )
+        _rewind(file_obj_or_path)
 
-def read_csv_any(file_obj_or_path) -> pd.DataFrame:
-    return pd.read_csv(file_obj_or_path)
+    # 3) fechas parseadas acá (mismo criterio que to_datetime_norm)
+    for c in DATE_COLS:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c], errors="coerce")
+    return df[keep]
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import List, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.features.buckets import bucket_edad_from_dob
+from rrhh_panel.filters.index import FilterIndex
+from rrhh_panel.filters.state import FilterState
+from rrhh_panel.preprocessing.intervals import IntervalIndex
+
+# =============================================================================
+# Retención por cohorte de ingreso: mes de ingreso × meses desde el ingreso
+# =============================================================================
+def _month_parts(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # (mes desde 1970, día del mes 0-based, largo del mes) para datetime64[D]
+    m = days.astype("datetime64[M]")
+    dom = (days - m.astype("datetime64[D]")).astype(np.int64)
+    month_len = ((m + 1).astype("datetime64[D]") - m.astype("datetime64[D]")).astype(np.int64)
+    return m.astype(np.int64), dom, month_len
+
+def retention_matrix(
+    df_intervals: pd.DataFrame,
+    first_month: pd.Timestamp,
+    last_month: pd.Timestamp,
+    cut_today: pd.Timestamp,
+    max_months: int,
+    edad_sel: List[str] | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # Cada intervalo fusionado es un ingreso (o reingreso). Cohorte = mes de ini; meses cumplidos =
+    # aniversarios mensuales de ini alcanzados por fin_eff (31-ene cumple 1 mes el 28/29-feb).
+    # Histograma 2-D (cohorte, meses cumplidos) + suma acumulada inversa = activos a m meses.
+    # Devuelve (retención, activos): Cohorte, Ingresos y M0..M{max_months}; celdas sin follow-up
+    # completo al corte quedan NaN en retención.
+    M = int(max_months)
+    m0 = int(np.datetime64(pd.Timestamp(first_month), "M").astype(np.int64))
+    C = int(np.datetime64(pd.Timestamp(last_month), "M").astype(np.int64)) - m0 + 1
+    cols = [f"M{m}" for m in range(M + 1)]
+    cohort_lbl = pd.period_range(pd.Timestamp(first_month), periods=max(C, 0), freq="M").astype(str)
+    if C <= 0 or df_intervals is None or df_intervals.empty:
+        empty = pd.DataFrame(columns=["Cohorte", "Ingresos"] + cols)
+        return empty, empty.copy()
+
+    d = df_intervals
+    if edad_sel:
+        # edad al ingreso (la antigüedad al ingreso es siempre 0: no aplica)
+        d = d[bucket_edad_from_dob(d["fnac"], d["ini"]).isin(edad_sel).to_numpy()]
+
+    mi, di, _ = _month_parts(d["ini"].values.astype("datetime64[D]"))
+    mf, df_, lf = _month_parts(d["fin_eff"].values.astype("datetime64[D]"))
+    cohort = mi - m0
+    ok = (cohort >= 0) & (cohort < C)
+    elapsed = mf - mi - (df_ < np.minimum(di, lf - 1))
+    k = np.clip(elapsed[ok], 0, M)
+
+    hist = np.bincount(cohort[ok] * (M + 1) + k, minlength=C * (M + 1)).reshape(C, M + 1)
+    active = np.cumsum(hist[:, ::-1], axis=1)[:, ::-1]
+    hires = active[:, 0]
+
+    # celda completa si el aniversario del último día del mes de cohorte ya ocurrió al corte
+    ct = pd.Timestamp(cut_today).normalize()
+    ct_m, ct_d, ct_len = _month_parts(np.array([np.datetime64(ct, "D")]))
+    last_full_month = int(ct_m[0]) - (0 if int(ct_d[0]) == int(ct_len[0]) - 1 else 1)
+    complete = (m0 + np.arange(C)[:, None] + np.arange(M + 1)[None, :]) <= last_full_month
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = np.where(complete & (hires[:, None] > 0), active / hires[:, None], np.nan)
+
+    base = pd.DataFrame({"Cohorte": cohort_lbl, "Ingresos": hires.astype(int)})
+    df_ret = pd.concat([base, pd.DataFrame(ret, columns=cols)], axis=1)
+    df_act = pd.concat([base, pd.DataFrame(np.where(complete, active, 0).astype(int), columns=cols)], axis=1)
+    return df_ret, df_act
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_retention_matrix(
+    _ix: IntervalIndex,
+    _fidx: FilterIndex,
+    _fs: FilterState,
+    selection_fp: str,
+    first_month: pd.Timestamp,
+    last_month: pd.Timestamp,
+    cut_today: pd.Timestamp,
+    max_months: int,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # _ix/_fidx/_fs no se hashean: selection_fp = huella de (dataset, filtros)
+    df_intervals = _ix.select(_fidx.mask(_fs))
+    return retention_matrix(df_intervals, first_month, last_month, cut_today, max_months, edad_sel=_fs.edad)
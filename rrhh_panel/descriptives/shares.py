@@ -4,8 +4,9 @@ from __future__ import annotations
 import numpy as np
 import pandas as pd
 
-from rrhh_panel.schema.historia_personal import MISSING_LABEL
-from rrhh_panel.descriptives.topn import topn_otros_multi
+from rrhh_panel.descriptives.topn import topn_otros_multi, fill_missing_label
+from rrhh_panel.preprocessing.historia_personal import person_ids
+from rrhh_panel.utils.counting import distinct_count_by
 
 def compute_exit_share_of_total_existences(
     df_now: pd.DataFrame,
@@ -19,13 +20,16 @@ def compute_exit_share_of_total_existences(
     if df_now is None or df_now.empty or total_exist_base is None or (isinstance(total_exist_base, float) and np.isnan(total_exist_base)) or total_exist_base <= 0:
         total_exist_base = float(len(df_now)) if (df_now is not None) else np.nan
 
-    ex = df_exit.copy()
-    ex[dim_col] = ex[dim_col].fillna(MISSING_LABEL).astype(str)
-    g_exit = ex.groupby(dim_col)["cod"].nunique().rename("Salidas").reset_index().rename(columns={dim_col: "Categoria"})
+    def _by_cat(df: pd.DataFrame, name: str) -> pd.DataFrame:
+        # personas distintas por categoría sobre códigos enteros (sin groupby/nunique)
+        key = fill_missing_label(df[dim_col])
+        cat, labels = pd.factorize(key)
+        n = distinct_count_by(cat, person_ids(df), len(labels))
+        g = pd.DataFrame({"Categoria": [str(x) for x in labels], name: n})
+        return g[g[name] > 0].reset_index(drop=True)
 
-    now = df_now.copy()
-    now[dim_col] = now[dim_col].fillna(MISSING_LABEL).astype(str)
-    g_now = now.groupby(dim_col)["cod"].nunique().rename("ExistSnapshot").reset_index().rename(columns={dim_col: "Categoria"})
+    g_exit = _by_cat(df_exit, "Salidas")
+    g_now = _by_cat(df_now, "ExistSnapshot")
 
     d = g_exit.merge(g_now, on="Categoria", how="left")
     d["ExistSnapshot"] = d["ExistSnapshot"].fillna(0).astype(int)
@@ -4,9 +4,22 @@ from __future__ import annotations
 import pandas as pd
 from rrhh_panel.schema.historia_personal import MISSING_LABEL
 
+def fill_missing_label(s: pd.Series) -> pd.Series:
+    # category se mantiene como category (conteos sobre códigos); el resto pasa a texto
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        if s.isna().any():
+            if MISSING_LABEL not in s.cat.categories:
+                s = s.cat.add_categories([MISSING_LABEL])
+            s = s.fillna(MISSING_LABEL)
+        return s
+    return s.fillna(MISSING_LABEL).astype(str)
+
 def counts_topn_with_otros(s: pd.Series, topn: int = 10) -> pd.DataFrame:
-    x = s.fillna(MISSING_LABEL).astype(str)
+    x = fill_missing_label(s)
     vc = x.value_counts(dropna=False)
+    if isinstance(x.dtype, pd.CategoricalDtype):
+        vc = vc[vc > 0]
+        vc.index = vc.index.astype(str)
     if vc.empty:
         return pd.DataFrame(columns=["Categoria", "N"])
     if len(vc) <= topn:
@@ -33,3 +46,11 @@ def topn_otros_multi(df: pd.DataFrame, cat_col: str, sort_col: str, topn: int) -
     otros[cat_col] = "OTROS"
     out = pd.concat([top, pd.DataFrame([otros])], ignore_index=True)
     return out
+
+def collapse_columns_otros(df: pd.DataFrame, cols: list, keep: list) -> pd.DataFrame:
+    # columnas de categoría fuera de keep se suman en "OTROS" (formato ancho: una columna por categoría)
+    rest = [c for c in cols if c not in keep]
+    out = df.drop(columns=rest)
+    if rest:
+        out["OTROS"] = df[rest].sum(axis=1)
+    return out
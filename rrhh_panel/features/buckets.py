@@ -1,13 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from datetime import timedelta
-from typing import Dict, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Tuple
 import numpy as np
 import pandas as pd
 
 from rrhh_panel.schema.historia_personal import MISSING_LABEL
-from rrhh_panel.utils.dates import years_offset_date
 
 TENURE_BUCKETS: Dict[str, Tuple[int, int | None]] = {
     "1) < 30 días": (0, 29),
@@ -27,42 +26,100 @@ AGE_BUCKETS: Dict[str, Tuple[int | None, int | None]] = {
     "7) > 56 años": (57, None),
 }
 
+# =============================================================================
+# Motor de buckets: bordes tomados de los diccionarios + searchsorted
+# =============================================================================
+def bucket_categories(buckets: Dict[str, Tuple[int | None, int | None]]) -> pd.CategoricalDtype:
+    # orden del diccionario + SIN DATO al final
+    return pd.CategoricalDtype(list(buckets.keys()) + [MISSING_LABEL], ordered=True)
+
+def bucket_codes(values: np.ndarray, valid: np.ndarray, buckets: Dict[str, Tuple[int | None, int | None]]) -> np.ndarray:
+    # código del bucket (posición en el dict) por valor entero; fuera de rango / inválido -> SIN DATO
+    lo = np.array([-np.inf if a is None else a for a, _ in buckets.values()], dtype=float)
+    hi = np.array([np.inf if b is None else b for _, b in buckets.values()], dtype=float)
+    order = np.argsort(lo, kind="stable")
+    v = np.asarray(values, dtype=float)
+
+    pos = np.searchsorted(lo[order], v, side="right") - 1
+    k = order[np.clip(pos, 0, None)]
+    ok = np.asarray(valid, dtype=bool) & (pos >= 0) & (v <= hi[k])
+    return np.where(ok, k, len(buckets)).astype(np.int8)
+
+def _as_categorical(codes: np.ndarray, buckets: Dict[str, Tuple[int | None, int | None]], index: pd.Index) -> pd.Series:
+    cat = pd.Categorical.from_codes(codes, dtype=bucket_categories(buckets))
+    return pd.Series(cat, index=index)
+
+def age_years(dob: pd.Series, ref: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    # edad entera cumplida (cumpleaños por mes/día: 29-feb cumple el 1-mar) y máscara de validez
+    b = dob.to_numpy(dtype="datetime64[D]")
+    r = ref.to_numpy(dtype="datetime64[D]")
+    valid = ~(np.isnat(b) | np.isnat(r))
+    b = np.where(valid, b, np.datetime64(0, "D"))
+    r = np.where(valid, r, np.datetime64(0, "D"))
+
+    def _ymd(d):
+        y = d.astype("datetime64[Y]")
+        m = d.astype("datetime64[M]")
+        md = (m - y.astype("datetime64[M]")).astype(np.int64) * 32 + (d - m.astype("datetime64[D]")).astype(np.int64)
+        return y.astype(np.int64), md
+
+    yb, mdb = _ymd(b)
+    yr, mdr = _ymd(r)
+    return yr - yb - (mdr < mdb), valid
+
 def bucket_antiguedad(days: pd.Series) -> pd.Series:
-    d = days.astype("float")
-    out = pd.Series(np.where(d.isna(), MISSING_LABEL, ""), index=days.index, dtype="object")
-    out = np.where((~pd.isna(d)) & (d >= 0) & (d < 30), "1) < 30 días", out)
-    out = np.where((~pd.isna(d)) & (d >= 30) & (d <= 90), "2) 30 - 90 días", out)
-    out = np.where((~pd.isna(d)) & (d >= 91) & (d <= 180), "3) 91 - 180 días", out)
-    out = np.where((~pd.isna(d)) & (d >= 181) & (d <= 360), "4) 181 - 360 días", out)
-    out = np.where((~pd.isna(d)) & (d >= 361), "5) > 360 días", out)
-    return pd.Series(out, index=days.index, dtype="object")
+    d = days.to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(d)
+    return _as_categorical(bucket_codes(np.where(valid, d, 0), valid, TENURE_BUCKETS), TENURE_BUCKETS, days.index)
 
 def bucket_edad_from_dob(dob: pd.Series, ref: pd.Series) -> pd.Series:
-    out = pd.Series(MISSING_LABEL, index=dob.index, dtype="object")
-    mask = (~dob.isna()) & (~ref.isna())
-    if not mask.any():
-        return out
-
-    dob2 = dob[mask]
-    ref2 = ref[mask]
-
-    had_bday = (ref2.dt.month > dob2.dt.month) | ((ref2.dt.month == dob2.dt.month) & (ref2.dt.day >= dob2.dt.day))
-    edad = (ref2.dt.year - dob2.dt.year) - (~had_bday).astype(int)
-
-    out.loc[mask] = np.where(edad < 24, "1) < 24 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 24) & (edad <= 30), "2) 24 - 30 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 31) & (edad <= 37), "3) 31 - 37 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 38) & (edad <= 42), "4) 38 - 42 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 43) & (edad <= 49), "5) 43 - 49 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 50) & (edad <= 56), "6) 50 - 56 años", out.loc[mask])
-    out.loc[mask] = np.where((edad >= 57), "7) > 56 años", out.loc[mask])
-    return out
-
-def make_stratum(active: pd.DataFrame, cut: pd.Timestamp) -> pd.DataFrame:
-    a = active.copy()
-    a["ref"] = pd.Timestamp(cut).normalize()
-    a["tenure_days"] = (a["ref"] - a["ini"]).dt.days
-    a["Antigüedad"] = bucket_antiguedad(a["tenure_days"])
-    a["Edad"] = bucket_edad_from_dob(a["fnac"], a["ref"])
-    a["Estrato"] = a["Edad"].astype(str) + " | " + a["Antigüedad"].astype(str)
-    return a
+    edad, valid = age_years(dob, ref)
+    return _as_categorical(bucket_codes(edad, valid, AGE_BUCKETS), AGE_BUCKETS, dob.index)
+
+# =============================================================================
+# Estratos: códigos enteros en radix mixto sobre dimensiones configurables
+# =============================================================================
+# dimensiones que cambian con el tiempo (se calculan al corte); el resto son columnas categóricas
+TIME_DIMS: Dict[str, Dict[str, Tuple[int | None, int | None]]] = {"edad": AGE_BUCKETS, "antig": TENURE_BUCKETS}
+
+@dataclass(frozen=True)
+class StrataSpec:
+    dims: Tuple[str, ...]
+    levels: Tuple[Tuple[str, ...], ...]   # etiquetas por dimensión (el dígito es la posición)
+
+    @property
+    def radices(self) -> np.ndarray:
+        return np.array([len(lv) for lv in self.levels], dtype=np.int64)
+
+    @property
+    def strides(self) -> np.ndarray:
+        # la primera dimensión es la más significativa
+        r = self.radices
+        return np.r_[np.cumprod(r[::-1])[::-1][1:], 1].astype(np.int64)
+
+    @property
+    def n_codes(self) -> int:
+        return int(self.radices.prod())
+
+    def encode(self, digits: Sequence[np.ndarray]) -> np.ndarray:
+        code = np.zeros(len(digits[0]) if len(digits) else 0, dtype=np.int64)
+        for d, k in zip(digits, self.strides):
+            code += np.asarray(d, dtype=np.int64) * k
+        return code
+
+    def labels(self, codes: np.ndarray) -> List[str]:
+        # "Edad | Antigüedad | ..." de cada código, decodificando sus dígitos (sin enumerar el producto)
+        codes = np.asarray(codes, dtype=np.int64)
+        parts = [np.asarray(lv, dtype=object)[(codes // k) % len(lv)] for lv, k in zip(self.levels, self.strides)]
+        return [" | ".join(t) for t in zip(*parts)] if parts else [""] * len(codes)
+
+def strata_spec(df: pd.DataFrame, dims: Sequence[str]) -> StrataSpec:
+    levels = []
+    for d in dims:
+        if d in TIME_DIMS:
+            levels.append(tuple(bucket_categories(TIME_DIMS[d]).categories))
+            continue
+        if d not in df.columns or not isinstance(df[d].dtype, pd.CategoricalDtype):
+            raise ValueError(f"Dimensión de estrato inválida: {d}")
+        levels.append(tuple(str(c) for c in df[d].cat.categories))
+    return StrataSpec(dims=tuple(dims), levels=tuple(levels))
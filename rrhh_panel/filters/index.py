@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.filters.state import FilterState
+
+FILTER_COLS = ["sexo", "area_gen", "area", "cargo", "clas", "ts", "emp", "nac", "lug", "reg"]
+
+# columnas con más valores que esto usan listas de filas en vez de bitmaps (memoria acotada)
+BITMAP_MAX_CARD = 64
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+# =============================================================================
+# Índice invertido (columna, valor) -> filas, para filtros categóricos
+# =============================================================================
+@dataclass(frozen=True)
+class FilterIndex:
+    n_rows: int
+    categories: Dict[str, pd.Index]                       # diccionario por columna
+    bitmaps: Dict[str, np.ndarray]                        # col -> (n_valores, n_bytes) bits empaquetados
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = field(default_factory=dict)  # col -> (filas, offsets)
+
+    def _column_bits(self, col: str, selected: List[str]) -> np.ndarray:
+        # OR dentro de la columna
+        cats = self.categories[col]
+        k = cats.get_indexer(pd.Index(selected))
+        k = k[k >= 0]
+        if col in self.bitmaps:
+            if len(k) == 0:
+                return np.zeros(self.bitmaps[col].shape[1], dtype=np.uint8)
+            return np.bitwise_or.reduce(self.bitmaps[col][k], axis=0)
+        rows, offsets = self.postings[col]
+        m = np.zeros(self.n_rows, dtype=bool)
+        for j in k:
+            m[rows[offsets[j]:offsets[j + 1]]] = True
+        return np.packbits(m)
+
+    def bits_for(self, selections: Mapping[str, List[str]]) -> np.ndarray | None:
+        # AND entre columnas; None = sin filtros activos (todas las filas)
+        out = None
+        for col in FILTER_COLS:
+            selected = selections.get(col)
+            if not selected or col not in self.categories:
+                continue
+            b = self._column_bits(col, selected)
+            out = b if out is None else np.bitwise_and(out, b)
+        return out
+
+    def bits(self, fs: FilterState) -> np.ndarray | None:
+        return self.bits_for({col: getattr(fs, col) for col in FILTER_COLS})
+
+    def value_counts(self, col: str, bits: np.ndarray | None) -> np.ndarray:
+        # n° de filas por valor de col dentro de la selección bits (alineado con categories[col])
+        if col in self.bitmaps:
+            bm = self.bitmaps[col]
+            return _POPCOUNT[bm if bits is None else np.bitwise_and(bm, bits)].sum(axis=1)
+        rows, offsets = self.postings[col]
+        if bits is None:
+            return np.diff(offsets)
+        hit = np.unpackbits(bits, count=self.n_rows)[rows]
+        cs = np.r_[0, np.cumsum(hit, dtype=np.int64)]
+        return cs[offsets[1:]] - cs[offsets[:-1]]
+
+    def mask(self, fs: FilterState) -> np.ndarray:
+        b = self.bits(fs)
+        if b is None:
+            return np.ones(self.n_rows, dtype=bool)
+        return np.unpackbits(b, count=self.n_rows).astype(bool)
+
+    def count(self, fs: FilterState) -> int:
+        # n° de filas seleccionadas sin materializar la máscara ni el DataFrame
+        b = self.bits(fs)
+        if b is None:
+            return self.n_rows
+        return int(_POPCOUNT[b].sum())
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_filter_index(_df: pd.DataFrame, fingerprint: str) -> FilterIndex:
+    # _df no se hashea: la clave es la huella del dataset
+    n = len(_df)
+    categories, bitmaps, postings = {}, {}, {}
+    for col in FILTER_COLS:
+        if col not in _df.columns:
+            continue
+        s = _df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            codes = s.cat.codes.to_numpy().astype(np.int64)
+            cats = pd.Index(s.cat.categories.astype(str))
+        else:
+            codes, cats = pd.factorize(s)
+            cats = pd.Index(pd.Index(cats).astype(str))
+
+        categories[col] = cats
+        valid = codes >= 0
+        rows = np.flatnonzero(valid)
+        order = np.argsort(codes[valid], kind="stable")
+        rows = rows[order]
+        offsets = np.r_[0, np.cumsum(np.bincount(codes[valid], minlength=len(cats)))]
+
+        if len(cats) <= BITMAP_MAX_CARD:
+            bm = np.zeros((len(cats), (n + 7) // 8), dtype=np.uint8)
+            for j in range(len(cats)):
+                m = np.zeros(n, dtype=bool)
+                m[rows[offsets[j]:offsets[j + 1]]] = True
+                bm[j] = np.packbits(m)
+            bitmaps[col] = bm
+        else:
+            postings[col] = (rows, offsets)
+
+    return FilterIndex(n_rows=n, categories=categories, bitmaps=bitmaps, postings=postings)
@@ -1,10 +1,41 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from typing import List
-import pandas as pd
+from typing import Dict, Tuple
+import streamlit as st
 
-def options_for_col(df: pd.DataFrame, col: str) -> List[str]:
-    v = df[col].dropna().astype(str).str.strip()
-    v = v[v != ""].unique().tolist()
-    return sorted(v)
+from rrhh_panel.filters.index import FilterIndex
+from rrhh_panel.utils.formatting import fmt_int_es
+
+# =============================================================================
+# Facetas: opciones + conteos bajo los demás filtros activos
+# =============================================================================
+# columna hija -> columna padre (las opciones de la hija se acotan a lo que existe bajo el padre)
+FACET_PARENT = {"area": "area_gen"}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def facet_counts(
+    _fidx: FilterIndex,
+    fingerprint: str,
+    selected: Tuple[Tuple[str, Tuple[str, ...]], ...],
+) -> Dict[str, Dict[str, int]]:
+    # selected: ((col, (valores...)), ...) hasheable; la clave del índice es la huella del dataset
+    sel = {c: list(v) for c, v in selected if v}
+    out: Dict[str, Dict[str, int]] = {}
+    for col, cats in _fidx.categories.items():
+        totals = _fidx.value_counts(col, None)
+        others = _fidx.bits_for({c: v for c, v in sel.items() if c != col})
+        counts = totals if others is None else _fidx.value_counts(col, others)
+
+        keep = totals > 0
+        parent = FACET_PARENT.get(col)
+        if parent and sel.get(parent):
+            keep &= _fidx.value_counts(col, _fidx.bits_for({parent: sel[parent]})) > 0
+
+        facet = {str(v): int(n) for v, n, k in zip(cats, counts, keep) if k and str(v).strip() != ""}
+        out[col] = {v: facet[v] for v in sorted(facet)}
+    return out
+
+def facet_label(counts: Dict[str, int]):
+    # format_func para multiselect: "valor (n)"
+    return lambda v: f"{v} ({fmt_int_es(counts.get(v, 0))})"
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Sequence
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.config.params import APPROX_STRATA_COL, APPROX_Z
+from rrhh_panel.filters.index import FilterIndex, build_filter_index
+from rrhh_panel.metrics.pyramid import PeriodPyramid
+from rrhh_panel.preprocessing.historia_personal import person_ids
+from rrhh_panel.preprocessing.intervals import IntervalIndex, build_interval_index
+from rrhh_panel.preprocessing.sampling import person_sample_mask
+
+# conteos que se expanden por 1/f (con banda de error si aplica) en serie diaria / periodos / KPI
+DAILY_COUNT_COLS = ("Salidas", "Existencias", "Ingresos", "Flujo_Neto", "Otros_Mov", "Existencias_Cierre")
+PERIOD_COUNT_COLS = ("Salidas", "Ingresos", "Flujo_Neto", "Otros_Mov", "Existencias_Prom", "Existencias_Cierre")
+ERR_COLS = ("Salidas", "Existencias", "Existencias_Prom", "Existencias_Cierre")
+
+# =============================================================================
+# Modo aproximado: índices sobre una muestra de personas + expansión con bandas de error
+# =============================================================================
+@dataclass(frozen=True)
+class ApproxSample:
+    ix: IntervalIndex       # índice de intervalos de la muestra
+    fidx: FilterIndex       # índice de filtros de la muestra
+    frac: float             # probabilidad de inclusión de cada persona (peso de expansión 1/frac)
+    n_persons: int
+    n_sampled: int
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_approx_sample(_df: pd.DataFrame, fingerprint: str, frac: float) -> ApproxSample:
+    # _df no se hashea: la clave es (huella del dataset, fracción)
+    m = person_sample_mask(_df, frac, APPROX_STRATA_COL)
+    sub = _df[m].reset_index(drop=True)
+    ix = build_interval_index(sub)
+    n_persons = int(len(np.unique(person_ids(_df)))) if len(_df) else 0
+    n_sampled = int(len(np.unique(person_ids(sub)))) if len(sub) else 0
+    return ApproxSample(
+        ix=ix,
+        fidx=build_filter_index(ix.events, ix.fingerprint),
+        frac=min(float(frac), 1.0),
+        n_persons=n_persons,
+        n_sampled=n_sampled,
+    )
+
+def _count_err(x: np.ndarray, f: float) -> np.ndarray:
+    # semiancho del IC para un conteo expandido x/f (personas ~ Bernoulli(f), corrección por población finita)
+    return APPROX_Z * np.sqrt(np.clip(x, 0, None) * (1.0 - f)) / f
+
+def scale_counts(df: pd.DataFrame, cols: Sequence[str], f: float, err_cols: Sequence[str] = ()) -> pd.DataFrame:
+    # conteos de la muestra -> estimación poblacional; agrega {col}_err para err_cols
+    out = df.copy()
+    for c in cols:
+        if c not in out.columns:
+            continue
+        x = out[c].to_numpy(dtype=float)
+        if c in err_cols:
+            out[f"{c}_err"] = _count_err(x, f)
+        out[c] = x / f
+    return out
+
+def scale_kpi(kpi: pd.DataFrame, f: float, min_base: int) -> pd.DataFrame:
+    # N/E se expanden; DS (razones) se mantienen y ganan {col}_err (binomial sobre el N muestral).
+    # La base baja se marca con el N muestral: es el que determina la precisión de la tasa.
+    if kpi is None or kpi.empty:
+        return kpi
+    out = kpi.copy()
+    n = out["N"].to_numpy(dtype=float)
+    out["flag_base_baja"] = (n < int(min_base)) | (n == 0)
+    for c in [c for c in kpi.columns if c.startswith("DS") and (c.endswith("_raw") or c.endswith("_std"))]:
+        p = out[c].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[f"{c}_err"] = np.where(n > 0, APPROX_Z * np.sqrt(p * (1.0 - p) * (1.0 - f) / n), np.nan)
+    count_cols = [c for c in kpi.columns if c in ("N", "E") or (c[:1] == "E" and c[1:].isdigit())]
+    out[count_cols] = out[count_cols].to_numpy(dtype=float) / f
+    return out
+
+def scale_pyramid(pyr: PeriodPyramid, f: float, min_base: int) -> PeriodPyramid:
+    # pirámide calculada sobre la muestra -> estimaciones poblacionales (el detalle de salidas queda muestral)
+    rolling_cols = [c for c in pyr.rolling.columns if c.startswith("Salidas_") or c.startswith("Existencias_Prom_")]
+    return replace(
+        pyr,
+        daily=scale_counts(pyr.daily, DAILY_COUNT_COLS, f, ERR_COLS),
+        rolling=scale_counts(pyr.rolling, rolling_cols, f),
+        periods={p: scale_counts(d, PERIOD_COUNT_COLS, f, ERR_COLS) for p, d in pyr.periods.items()},
+        kpi={p: scale_kpi(d, f, min_base) for p, d in pyr.kpi.items()},
+        kpi_horizons={p: scale_kpi(d, f, min_base) for p, d in pyr.kpi_horizons.items()},
+    )
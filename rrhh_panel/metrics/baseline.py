@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.config.params import STD_STRATA_DIMS
+from rrhh_panel.preprocessing.intervals import IntervalIndex
+from rrhh_panel.preprocessing.lexis import build_lexis_table
+from rrhh_panel.metrics.kpi_ds30_std_v1 import (
+    compute_standard_weights_from_baseline,
+    compute_ds30_std_by_period,
+    meta_from_last_year_last3,
+)
+
+# =============================================================================
+# Artefactos de baseline (no dependen de los filtros categóricos)
+# =============================================================================
+@dataclass(frozen=True)
+class BaselineArtifacts:
+    period: str
+    year: int
+    base_start: pd.Timestamp
+    base_end: pd.Timestamp
+    weights: pd.DataFrame     # pesos w_s por estrato (Estrato, Estrato_cod, w)
+    kpi_base: pd.DataFrame    # KPI del año baseline (población completa)
+    meta: float               # meta_from_last_year_last3 sobre kpi_base
+
+def baseline_window(year: int, min_date: pd.Timestamp, max_date: pd.Timestamp) -> tuple[pd.Timestamp, pd.Timestamp]:
+    base_start = pd.Timestamp(date(int(year), 1, 1))
+    base_end = pd.Timestamp(date(int(year), 12, 31))
+    if pd.notna(min_date):
+        base_start = max(base_start, pd.Timestamp(min_date).normalize())
+    if pd.notna(max_date):
+        base_end = min(base_end, pd.Timestamp(max_date).normalize())
+    return base_start, base_end
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def get_baseline_artifacts(
+    _ix: IntervalIndex,
+    fingerprint: str,
+    period: str,
+    year: int,
+    cut_today: pd.Timestamp,
+    H_days: int = 30,
+    min_base: int = 30,
+    dims: tuple[str, ...] = STD_STRATA_DIMS,
+) -> BaselineArtifacts:
+    # _ix no se hashea: la clave es (fingerprint del dataset, periodo, año baseline, corte)
+    base_start, base_end = baseline_window(year, _ix.min_date, _ix.max_date)
+    lx = build_lexis_table(_ix, fingerprint)
+
+    weights = compute_standard_weights_from_baseline(
+        df_intervals_baseline=_ix.intervals,
+        period=period,
+        ref_start=base_start,
+        ref_end=base_end,
+        dims=dims,
+        _lexis=lx,
+    )
+    kpi_base = compute_ds30_std_by_period(
+        df_intervals=_ix.intervals,
+        start=base_start,
+        end=base_end,
+        period=period,
+        cut_today=cut_today,
+        weights=weights,
+        H_days=H_days,
+        min_base=min_base,
+        dims=dims,
+        _lexis=lx,
+    )
+    meta = meta_from_last_year_last3(kpi_base, end_dt=pd.Timestamp(date(int(year) + 1, 1, 1)), value_col="DS30_std")
+
+    return BaselineArtifacts(
+        period=period,
+        year=int(year),
+        base_start=base_start,
+        base_end=base_end,
+        weights=weights,
+        kpi_base=kpi_base,
+        meta=float(meta) if pd.notna(meta) else np.nan,
+    )
@@ -1,159 +1,185 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from datetime import date, timedelta
 from typing import List, Tuple
 import numpy as np
 import pandas as pd
 import streamlit as st
 
-from rrhh_panel.features.buckets import TENURE_BUCKETS, AGE_BUCKETS, bucket_antiguedad, bucket_edad_from_dob
-from rrhh_panel.schema.historia_personal import MISSING_LABEL
-from rrhh_panel.utils.dates import add_calendar_fields, to_datetime_norm, years_offset_date
+from rrhh_panel.features.buckets import TENURE_BUCKETS, AGE_BUCKETS, bucket_categories
+from rrhh_panel.preprocessing.lexis import LexisTable, lexis_split
+from rrhh_panel.utils.dates import add_calendar_fields
+
+# =============================================================================
+# Tramos activos por intervalo (filtros de antigüedad/edad) y motor de flujos
+# =============================================================================
+def _selected_runs(lx: LexisTable, antig_sel: List[str], edad_sel: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Tramos [s, e] (días int64) en que cada intervalo cumple los buckets elegidos, sin recortar al rango:
+    # tramos Lexis de la selección, uniendo los contiguos del mismo intervalo. Devuelve (s, e, posición).
+    m = lx.mask(antig_sel, edad_sel)
+    s = lx.s[m].astype(np.int64)
+    e = lx.e[m].astype(np.int64)
+    pos = lx.pos[m].astype(np.int64)
+    if len(s) == 0:
+        return s, e, pos
+    first = np.r_[True, (pos[1:] != pos[:-1]) | (s[1:] != e[:-1] + 1)]
+    last = np.r_[first[1:], True]
+    return s[first], e[last], pos[first]
+
+def _real_exit(g: pd.DataFrame, cut_today: pd.Timestamp) -> np.ndarray:
+    # por intervalo: fin_eff es una salida real (no en curso). En curso: fin_eff = hoy por un fin vacío;
+    # si el último evento cierra en fin_eff, o fin_eff no es hoy, el máximo fin_eff es una salida real
+    fin_eff = g["fin_eff"].values.astype("datetime64[D]")
+    fin = g["fin"].values.astype("datetime64[D]")
+    return (~np.isnat(fin) & (fin == fin_eff)) | (fin_eff != np.datetime64(pd.Timestamp(cut_today), "D"))
+
+FLOW_COLS = ["Ingresos", "Salidas", "Flujo_Neto", "Otros_Mov", "Existencias", "Existencias_Cierre"]
 
 @st.cache_data(show_spinner=False)
-def compute_existencias_daily_filtered_fast(
+def compute_flows_daily_filtered(
     df_intervals: pd.DataFrame,
     start: pd.Timestamp,
     end: pd.Timestamp,
     antig_sel: List[str],
     edad_sel: List[str],
-) -> pd.DataFrame:
+    cut_today: pd.Timestamp,
+    _lexis: LexisTable | None = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # _lexis: tabla persona-periodo de df_intervals (no se hashea; se deriva de df_intervals si falta).
+    # Una pasada sobre los tramos activos: altas (+1 en s) y bajas (-1 en e+1) en arrays de diferencias.
+    #   Ingresos: tramos que parten en el ini del intervalo (ingreso / reingreso)
+    #   Salidas: tramos que terminan en un fin real del intervalo (salida efectiva, no en curso);
+    #            una por persona y día por construcción (los intervalos de una persona no se solapan)
+    #   Otros_Mov: entradas - salidas de la selección por cambio de tramo de edad/antigüedad
+    #              o fin de seguimiento (intervalos en curso)
+    #   Existencias: activos en el día; Existencias_Cierre: activos que siguen al día siguiente
+    # Conciliación: Cierre[d] = Cierre[d-1] + Ingresos[d] - Salidas[d] + Otros_Mov[d]
+    # Devuelve (serie diaria, detalle de salidas: intervalo + ref_fin y buckets al salir).
     idx = pd.date_range(start, end, freq="D")
     n = len(idx)
+    det_cols = list(df_intervals.columns) + ["ref_fin", "Antigüedad", "Edad"]
     if n == 0:
-        return pd.DataFrame({"Día": [], "Existencias": []})
-
-    g = df_intervals[(df_intervals["ini"] <= end) & (df_intervals["fin_eff"] >= start)].copy()
-    if g.empty:
-        out = pd.DataFrame({"Día": idx, "Existencias": np.zeros(n, dtype=int)})
-        return add_calendar_fields(out, "Día")
-
-    use_antig = bool(antig_sel)
-    use_edad = bool(edad_sel)
+        return pd.DataFrame({"Día": [], **{c: [] for c in FLOW_COLS}}), pd.DataFrame(columns=det_cols)
 
-    ini_days = g["ini"].values.astype("datetime64[D]").astype("int64")
-    fin_days = g["fin_eff"].values.astype("datetime64[D]").astype("int64")
     start_day = np.datetime64(start, "D").astype("int64")
     end_day = np.datetime64(end, "D").astype("int64")
 
-    diff = np.zeros(n + 1, dtype=np.int64)
-
-    antig_list = [b for b in antig_sel if b in TENURE_BUCKETS] if use_antig else []
-    edad_list = [b for b in edad_sel if b in AGE_BUCKETS] if use_edad else []
-    edad_allow_sindato = use_edad and (MISSING_LABEL in edad_sel)
-
-    fnac_vals = g["fnac"].values
-
-    for i in range(len(g)):
-        base_s = max(ini_days[i], start_day)
-        base_e = min(fin_days[i], end_day)
-        if base_s > base_e:
-            continue
-
-        if (not use_antig) and (not use_edad):
-            s_idx = int(base_s - start_day)
-            e_idx = int(base_e - start_day)
-            diff[s_idx] += 1
-            diff[e_idx + 1 if (e_idx + 1 < n) else n] -= 1
-            continue
-
-        dob_ts = fnac_vals[i]
-        dob_missing = pd.isna(dob_ts)
-        if use_edad and dob_missing and not edad_allow_sindato:
-            continue
-
-        ini0 = ini_days[i]
-
-        # Antig
-        if use_antig and antig_list:
-            antig_ranges = []
-            for b in antig_list:
-                a0, a1 = TENURE_BUCKETS[b]
-                s = max(ini0 + a0, base_s)
-                e = min(base_e, (base_e if a1 is None else ini0 + a1))
-                if s <= e:
-                    antig_ranges.append((s, e))
-            if not antig_ranges:
-                continue
-        else:
-            antig_ranges = [(base_s, base_e)]
-
-        # Edad
-        if use_edad and (not dob_missing) and edad_list:
-            dob_date = pd.Timestamp(dob_ts).date()
-            edad_ranges = []
-            for b in edad_list:
-                y0, y1 = AGE_BUCKETS[b]
-                s_date = start.date() if y0 is None else years_offset_date(dob_date, y0)
-                e_date = end.date() if y1 is None else (years_offset_date(dob_date, y1 + 1) - timedelta(days=1))
-
-                s = max(np.int64(np.datetime64(s_date, "D").astype("int64")), base_s)
-                e = min(np.int64(np.datetime64(e_date, "D").astype("int64")), base_e)
-                if s <= e:
-                    edad_ranges.append((s, e))
-            if not edad_ranges:
-                continue
-        else:
-            edad_ranges = [(base_s, base_e)]
-
-        # Intersección
-        for (as_, ae_) in antig_ranges:
-            for (es_, ee_) in edad_ranges:
-                s = max(as_, es_)
-                e = min(ae_, ee_)
-                if s <= e:
-                    s_idx = int(s - start_day)
-                    e_idx = int(e - start_day)
-                    diff[s_idx] += 1
-                    diff[e_idx + 1 if (e_idx + 1 < n) else n] -= 1
-
-    exist = np.cumsum(diff[:-1]).astype(int)
-    out = pd.DataFrame({"Día": idx, "Existencias": exist})
-    return add_calendar_fields(out, "Día")
+    lx = _lexis if _lexis is not None else lexis_split(df_intervals)
+    s, e, pos = _selected_runs(lx, antig_sel, edad_sel)
+    near = (s <= end_day) & (e >= start_day)
+    s, e, pos = s[near], e[near], pos[near]
+    if len(s) == 0:
+        out = pd.DataFrame({"Día": idx, **{c: np.zeros(n, dtype=int) for c in FLOW_COLS}})
+        return add_calendar_fields(out, "Día"), pd.DataFrame(columns=det_cols)
+
+    g = df_intervals
+    ini_days = g["ini"].values.astype("datetime64[D]").astype("int64")
+    fin_eff_days = g["fin_eff"].values.astype("datetime64[D]").astype("int64")
+    real_exit = _real_exit(g, cut_today)
+
+    # stock: tramo recortado al rango
+    cs = np.maximum(s, start_day) - start_day
+    ce = np.minimum(e, end_day) - start_day
+    ok = cs <= ce
+    diff = np.bincount(cs[ok], minlength=n + 1)[: n + 1].astype(np.int64)
+    diff -= np.bincount(np.minimum(ce[ok] + 1, n), minlength=n + 1)[: n + 1]
+    exist = np.cumsum(diff[:-1])
+
+    # flujos: inicios / términos de tramo dentro del rango
+    s_in = (s >= start_day) & (s <= end_day)
+    e_in = (e >= start_day) & (e <= end_day)
+    hire = s_in & (s == ini_days[pos])
+    leave = e_in & (e == fin_eff_days[pos]) & real_exit[pos]
+
+    in_all = np.bincount(s[s_in] - start_day, minlength=n)
+    out_all = np.bincount(e[e_in] - start_day, minlength=n)
+    ingresos = np.bincount(s[hire] - start_day, minlength=n)
+    salidas = np.bincount(e[leave] - start_day, minlength=n)
+
+    out = pd.DataFrame({
+        "Día": idx,
+        "Ingresos": ingresos.astype(int),
+        "Salidas": salidas.astype(int),
+        "Flujo_Neto": (ingresos - salidas).astype(int),
+        "Otros_Mov": ((in_all - ingresos) - (out_all - salidas)).astype(int),
+        "Existencias": exist.astype(int),
+        "Existencias_Cierre": (exist - out_all).astype(int),
+    })
+
+    # detalle: el intervalo que sale, con los buckets de su último tramo Lexis (el que termina en fin_eff)
+    p_exit = pos[leave]
+    last_seg = lx.offsets[1:][p_exit] - 1
+    det = g.iloc[p_exit].reset_index(drop=True)
+    det["ref_fin"] = pd.to_datetime(e[leave].astype("datetime64[D]")).astype(g["fin_eff"].dtype)
+    det["Antigüedad"] = pd.Categorical.from_codes(lx.antig[last_seg], dtype=bucket_categories(TENURE_BUCKETS))
+    det["Edad"] = pd.Categorical.from_codes(lx.edad[last_seg], dtype=bucket_categories(AGE_BUCKETS))
+    det = det.sort_values("ref_fin", kind="stable").reset_index(drop=True)
+    return add_calendar_fields(out, "Día"), det
+
+# =============================================================================
+# Desglose por dimensión: matrices día × categoría en una pasada (diferencias 2-D)
+# =============================================================================
+# dimensiones que dependen del día (buckets) -> diccionario de buckets
+BUCKET_DIMS = {"Antigüedad": TENURE_BUCKETS, "Edad": AGE_BUCKETS}
+
+def _dim_segments(g: pd.DataFrame, lx: LexisTable, antig_sel: List[str], edad_sel: List[str], dim: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # tramos Lexis de la selección (s, e) con el código de categoría de dim en cada tramo y su intervalo
+    m = lx.mask(antig_sel, edad_sel)
+    if dim == "Antigüedad":
+        code = lx.antig[m]
+    elif dim == "Edad":
+        code = lx.edad[m]
+    else:
+        code = g[dim].cat.codes.to_numpy()[lx.pos[m]]
+    return lx.s[m].astype(np.int64), lx.e[m].astype(np.int64), code.astype(np.int64), lx.pos[m].astype(np.int64)
 
 @st.cache_data(show_spinner=False)
-def compute_salidas_daily_filtered(
-    df_events: pd.DataFrame,
+def compute_existencias_salidas_by_dim(
+    df_intervals: pd.DataFrame,
     start: pd.Timestamp,
     end: pd.Timestamp,
     antig_sel: List[str],
     edad_sel: List[str],
-    unique_personas_por_dia: bool = True,
+    dim: str,
+    cut_today: pd.Timestamp,
+    _lexis: LexisTable | None = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # (Existencias, Salidas) en formato ancho: Día + una columna por categoría presente.
+    # Mismos tramos y misma regla de salida que compute_flows_daily_filtered: las columnas suman la serie diaria.
     idx = pd.date_range(start, end, freq="D")
-    if len(idx) == 0:
-        return pd.DataFrame({"Día": [], "Salidas": []}), df_events.iloc[0:0].copy()
-
-    d = df_events[~df_events["fin"].isna()].copy()
-    d = d[(d["fin"] >= start) & (d["fin"] <= end)].copy()
-
-    if d.empty:
-        out = pd.DataFrame({"Día": idx, "Salidas": np.zeros(len(idx), dtype=int)})
-        return add_calendar_fields(out, "Día"), d
-
-    d = d.rename(columns={"fin": "ref_fin"})
-    d["ref_fin"] = to_datetime_norm(d["ref_fin"])
-
-    d["antig_dias"] = (d["ref_fin"] - d["ini"]).dt.days
-    d["Antigüedad"] = bucket_antiguedad(d["antig_dias"])
-    d["Edad"] = bucket_edad_from_dob(d["fnac"], d["ref_fin"])
+    n = len(idx)
+    if dim in BUCKET_DIMS:
+        cats = [str(c) for c in bucket_categories(BUCKET_DIMS[dim]).categories]
+    else:
+        cats = [str(c) for c in df_intervals[dim].cat.categories]
+    K = len(cats)
+    if n == 0 or K == 0:
+        return pd.DataFrame({"Día": idx}), pd.DataFrame({"Día": idx})
 
-    if antig_sel:
-        d = d[d["Antigüedad"].isin(antig_sel)]
-    if edad_sel:
-        d = d[d["Edad"].isin(edad_sel)]
+    start_day = np.datetime64(start, "D").astype("int64")
+    end_day = np.datetime64(end, "D").astype("int64")
 
-    if unique_personas_por_dia:
-        g = d.groupby("ref_fin")["cod"].nunique().rename("Salidas")
-    else:
-        g = d.groupby("ref_fin")["cod"].size().rename("Salidas")
-
-    out = pd.DataFrame({"Día": idx}).merge(
-        g.reset_index().rename(columns={"ref_fin": "Día"}),
-        on="Día",
-        how="left",
-    )
-    out["Salidas"] = out["Salidas"].fillna(0).astype(int)
-    out = add_calendar_fields(out, "Día")
-    return out, d
+    # Existencias: +1 en (inicio, cat), -1 en (fin+1, cat); cumsum por columna
+    # Salidas: tramos que terminan en un fin real del intervalo, conteo (día, cat)
+    exist = np.zeros((n, K), dtype=np.int64)
+    sal = np.zeros((n, K), dtype=np.int64)
+    if not df_intervals.empty:
+        lx = _lexis if _lexis is not None else lexis_split(df_intervals)
+        s, e, code, pos = _dim_segments(df_intervals, lx, antig_sel, edad_sel, dim)
+        cs = np.maximum(s, start_day) - start_day
+        ce = np.minimum(e, end_day) - start_day
+        ok = (cs <= ce) & (code >= 0)
+        size = (n + 1) * K
+        diff = np.bincount(cs[ok] * K + code[ok], minlength=size)
+        diff -= np.bincount(np.minimum(ce[ok] + 1, n) * K + code[ok], minlength=size)
+        exist = np.cumsum(diff.reshape(n + 1, K), axis=0)[:n]
+
+        fin_eff_days = df_intervals["fin_eff"].values.astype("datetime64[D]").astype("int64")
+        leave = (e >= start_day) & (e <= end_day) & (code >= 0) & (e == fin_eff_days[pos]) & _real_exit(df_intervals, cut_today)[pos]
+        sal = np.bincount((e[leave] - start_day) * K + code[leave], minlength=n * K).reshape(n, K)
+
+    present = (exist.sum(axis=0) > 0) | (sal.sum(axis=0) > 0)
+    names = [c for c, p in zip(cats, present) if p]
+    df_exist = pd.concat([pd.DataFrame({"Día": idx}), pd.DataFrame(exist[:, present], columns=names)], axis=1)
+    df_sal = pd.concat([pd.DataFrame({"Día": idx}), pd.DataFrame(sal[:, present], columns=names)], axis=1)
+    return df_exist, df_sal
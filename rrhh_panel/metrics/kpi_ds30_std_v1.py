@@ -1,152 +1,216 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from typing import Dict
+from typing import Sequence, Tuple
 import numpy as np
 import pandas as pd
 import streamlit as st
 
-from rrhh_panel.preprocessing.historia_personal import merge_intervals_per_person
 from rrhh_panel.time_windows.windows import build_period_windows
-from rrhh_panel.features.buckets import make_stratum
+from rrhh_panel.config.params import KPI_HORIZONS_DAYS, STD_STRATA_DIMS
+from rrhh_panel.features.buckets import TIME_DIMS, StrataSpec, strata_spec
+from rrhh_panel.preprocessing.lexis import LexisTable, lexis_split
+
+# =============================================================================
+# Kernel: conteos por (corte, estrato) en una sola pasada
+# =============================================================================
+def _stratum_segments(df_int: pd.DataFrame, spec: StrataSpec, lx: LexisTable | None = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    # Tramos de estrato constante: tramos Lexis (Edad × Antigüedad constantes) con el código de spec;
+    # las demás dimensiones son fijas por intervalo. Devuelve (inicio, fin, código, posición), días int64.
+    if lx is None:
+        lx = lexis_split(df_int)
+    pos = lx.pos.astype(np.int64)
+    digit = {"edad": lx.edad, "antig": lx.antig}
+    code = spec.encode([digit[d] if d in TIME_DIMS else df_int[d].cat.codes.to_numpy()[pos] for d in spec.dims])
+    return lx.s.astype(np.int64), lx.e.astype(np.int64), code, pos
+
+def _range_counts_by_cut(cut_days: np.ndarray, lo: np.ndarray, hi: np.ndarray, code: np.ndarray, n_codes: int) -> np.ndarray:
+    # matriz (corte × estrato): n° de tramos [lo, hi] que contienen cada corte (cut_days ordenado)
+    k = len(cut_days)
+    i0 = np.searchsorted(cut_days, lo, side="left")
+    i1 = np.searchsorted(cut_days, hi, side="right")
+    ok = i0 < i1
+    size = (k + 1) * n_codes
+    diff = np.bincount(i0[ok] * n_codes + code[ok], minlength=size)
+    diff -= np.bincount(i1[ok] * n_codes + code[ok], minlength=size)
+    m = diff.reshape(k + 1, n_codes)
+    np.cumsum(m, axis=0, out=m)
+    return m[:k]
+
+def _stratum_counts_by_cut(
+    df_int: pd.DataFrame, cut_days: np.ndarray, spec: StrataSpec, horizons: Sequence[int] = (), lx: LexisTable | None = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # N_s[c, s]: activos en el corte c con estrato s.
+    # E_s[c, s, j]: de ellos, con fin real en (c, c+horizons[j]] (horizons ordenado ascendente): curva de
+    # salidas acumuladas desde el corte, en una sola pasada para todos los horizontes.
+    # Los intervalos fusionados no se solapan por persona, así que cada persona cuenta 1 vez por corte.
+    # s recorre solo los estratos presentes en los tramos (ids densos): el costo no depende del producto
+    # de cardinalidades de spec. Devuelve también codes[s] = código radix mixto de cada columna.
+    seg_s, seg_e, code, pos = _stratum_segments(df_int, spec, lx)
+    codes, code = np.unique(code, return_inverse=True)
+    n_codes = len(codes)
+    N_s = _range_counts_by_cut(cut_days, seg_s, seg_e, code, n_codes)
+    J = len(horizons)
+    if J == 0:
+        return N_s, np.zeros(N_s.shape + (0,), dtype=np.int64), codes
+
+    # salida en el tramo j: fin - cut en (h[j-1], h[j]]  <=>  cut en [fin - h[j], fin - h[j-1] - 1]
+    fin = df_int["fin"].values.astype("datetime64[D]")
+    has_fin = ~np.isnat(fin)[pos]
+    fin_days = fin.astype("int64")[pos][has_fin]
+    seg_s, seg_e, code = seg_s[has_fin], seg_e[has_fin], code[has_fin]
+    h = np.asarray(horizons, dtype=np.int64)
+    h_prev = np.r_[0, h[:-1]]
+    lo = np.maximum(seg_s[:, None], fin_days[:, None] - h[None, :])
+    hi = np.minimum(seg_e[:, None], fin_days[:, None] - h_prev[None, :] - 1)
+    code_j = code[:, None] * J + np.arange(J)[None, :]
+    E_bin = _range_counts_by_cut(cut_days, lo.ravel(), hi.ravel(), code_j.ravel(), n_codes * J)
+    E_s = E_bin.reshape(len(cut_days), n_codes, J)
+    np.cumsum(E_s, axis=2, out=E_s)
+    return N_s, E_s, codes
+
+def _cut_days(windows: pd.DataFrame) -> np.ndarray:
+    return pd.to_datetime(windows["cut"]).dt.normalize().values.astype("datetime64[D]").astype("int64")
 
 @st.cache_data(show_spinner=False)
 def compute_standard_weights_from_baseline(
-    df_events_baseline: pd.DataFrame,
+    df_intervals_baseline: pd.DataFrame,
     period: str,
     ref_start: pd.Timestamp,
     ref_end: pd.Timestamp,
+    dims: Tuple[str, ...] = STD_STRATA_DIMS,
+    _lexis: LexisTable | None = None,
 ) -> pd.DataFrame:
-    # pesos w_s = composición acumulada de snapshots en baseline
-    if df_events_baseline is None or df_events_baseline.empty:
-        return pd.DataFrame(columns=["Estrato", "w"])
+    # _lexis: tabla persona-periodo de los intervalos (no se hashea; se deriva si falta)
+    # pesos w_s = composición acumulada de snapshots en baseline (Estrato_cod = código radix mixto)
+    empty = pd.DataFrame(columns=["Estrato", "Estrato_cod", "w"])
+    if df_intervals_baseline is None or df_intervals_baseline.empty:
+        return empty
 
-    df_int = merge_intervals_per_person(df_events_baseline)
     windows = build_period_windows(ref_start, ref_end, period)
     if windows.empty:
-        return pd.DataFrame(columns=["Estrato", "w"])
-
-    acc: Dict[str, int] = {}
-    for _, w in windows.iterrows():
-        cut = pd.Timestamp(w["cut"]).normalize()
-        active = df_int[(df_int["ini"] <= cut) & (df_int["fin_eff"] >= cut)].copy()
-        if active.empty:
-            continue
-        active = active.sort_values(["cod", "ini"]).groupby("cod", as_index=False).tail(1).copy()
-        active = make_stratum(active, cut)
-        cts = active.groupby("Estrato")["cod"].nunique()
-        for k, v in cts.items():
-            acc[k] = acc.get(k, 0) + int(v)
-
-    if not acc:
-        return pd.DataFrame(columns=["Estrato", "w"])
-
-    w = pd.DataFrame({"Estrato": list(acc.keys()), "count": list(acc.values())})
+        return empty
+
+    spec = strata_spec(df_intervals_baseline, dims)
+    N_s, _, codes = _stratum_counts_by_cut(df_intervals_baseline, np.sort(_cut_days(windows)), spec, lx=_lexis)
+    acc = N_s.sum(axis=0)
+    if acc.sum() == 0:
+        return empty
+
+    keep = np.flatnonzero(acc)
+    code = codes[keep]
+    w = pd.DataFrame({"Estrato": spec.labels(code), "Estrato_cod": code, "count": acc[keep]})
     w["w"] = w["count"] / float(w["count"].sum())
-    return w[["Estrato", "w"]].sort_values("w", ascending=False).reset_index(drop=True)
+    return w[["Estrato", "Estrato_cod", "w"]].sort_values("w", ascending=False).reset_index(drop=True)
+
+def _weight_vector(weights: pd.DataFrame | None, codes: np.ndarray) -> np.ndarray | None:
+    # pesos alineados con codes (códigos de estrato ordenados, sin merge por etiqueta); None si no hay pesos
+    wdf = weights.copy() if weights is not None else pd.DataFrame(columns=["Estrato_cod", "w"])
+    if not wdf.empty:
+        wdf["w"] = pd.to_numeric(wdf["w"], errors="coerce")
+        wdf = wdf.dropna(subset=["Estrato_cod", "w"])
+    if wdf.empty:
+        return None
+    wcode = wdf["Estrato_cod"].to_numpy(dtype=np.int64)
+    i = np.searchsorted(codes, wcode)
+    known = i < len(codes)
+    known[known] = codes[i[known]] == wcode[known]
+    return np.bincount(i[known], weights=wdf["w"].to_numpy(dtype=float)[known], minlength=len(codes))
 
 @st.cache_data(show_spinner=False)
-def compute_ds30_std_by_period(
-    df_events_filtered: pd.DataFrame,
+def compute_ds_multi_horizon_by_period(
+    df_intervals: pd.DataFrame,
     start: pd.Timestamp,
     end: pd.Timestamp,
     period: str,
     cut_today: pd.Timestamp,
     weights: pd.DataFrame,
-    H_days: int = 30,
+    horizons: Tuple[int, ...] = KPI_HORIZONS_DAYS,
     min_base: int = 30,
+    dims: Tuple[str, ...] = STD_STRATA_DIMS,
+    _lexis: LexisTable | None = None,
 ) -> pd.DataFrame:
-    if df_events_filtered is None or df_events_filtered.empty:
+    # Deserción a varios horizontes leída de la curva de salidas desde cada corte (por estrato):
+    # por horizonte H, E{H} / DS{H}_raw / DS{H}_std / flag_incomplete_{H}d (censura: cut + H > cut_today).
+    if df_intervals is None or df_intervals.empty:
         return pd.DataFrame()
 
-    df_int = merge_intervals_per_person(df_events_filtered)
     windows = build_period_windows(start, end, period).copy()
     if windows.empty:
         return pd.DataFrame()
 
     ct = pd.Timestamp(cut_today).normalize()
-    H = int(H_days)
-
-    wdf = weights.copy() if weights is not None else pd.DataFrame(columns=["Estrato", "w"])
-    if not wdf.empty:
-        wdf = wdf.dropna(subset=["Estrato", "w"]).copy()
-        wdf["Estrato"] = wdf["Estrato"].astype(str)
-        wdf["w"] = pd.to_numeric(wdf["w"], errors="coerce")
-
-    rows = []
-    for _, w in windows.iterrows():
-        cut = pd.Timestamp(w["cut"]).normalize()
-        flag_incomplete = bool((cut + pd.Timedelta(days=H)) > ct)
-
-        active = df_int[(df_int["ini"] <= cut) & (df_int["fin_eff"] >= cut)].copy()
-        if active.empty:
-            rows.append({
-                "Periodo": w["Periodo"],
-                "cut": cut,
-                "N": 0,
-                "E": 0,
-                "DS30_raw": np.nan,
-                "DS30_std": np.nan,
-                "coverage_w": 0.0,
-                "flag_incomplete_30d": flag_incomplete,
-                "flag_base_baja": True,
-            })
-            continue
-
-        active = active.sort_values(["cod", "ini"]).groupby("cod", as_index=False).tail(1).copy()
-        active = make_stratum(active, cut)
-
-        # Evento en 30 días: fin real en (cut, cut+H]
-        active["evento_30d"] = (~active["fin"].isna()) & (active["fin"] > cut) & (active["fin"] <= (cut + pd.Timedelta(days=H)))
-
-        N = int(active["cod"].nunique())
-        E = int(active.loc[active["evento_30d"], "cod"].nunique())
-        ds_raw = (float(E) / float(N)) if N > 0 else np.nan
-
-        # Estándar: p_s por estrato
-        tab = active.groupby("Estrato").agg(
-            N_s=("cod", "nunique"),
-            E_s=("evento_30d", "sum"),
-        ).reset_index()
-        tab["p_s"] = np.where(tab["N_s"] > 0, tab["E_s"] / tab["N_s"], np.nan)
-
-        ds_std = np.nan
-        coverage = 0.0
-        if (wdf is not None) and (not wdf.empty):
-            j = wdf.merge(tab[["Estrato", "p_s"]], on="Estrato", how="left")
-            mask = ~j["p_s"].isna() & ~j["w"].isna()
-            coverage = float(j.loc[mask, "w"].sum()) if mask.any() else 0.0
-            if coverage > 0:
-                ds_std = float((j.loc[mask, "w"] * j.loc[mask, "p_s"]).sum() / coverage)
-        else:
-            ds_std = ds_raw
-            coverage = 1.0 if pd.notna(ds_raw) else 0.0
-
-        flag_base_baja = bool(N < int(min_base))
-
+    hs = sorted({int(h) for h in horizons})
+    spec = strata_spec(df_intervals, dims)
+
+    # todos los cortes y horizontes de una vez (cortes ordenados para searchsorted)
+    cut_days = _cut_days(windows)
+    order = np.argsort(cut_days, kind="stable")
+    N_s, E_s, codes = _stratum_counts_by_cut(df_intervals, cut_days[order], spec, hs, _lexis)
+    if (np.diff(order) != 1).any():
+        inv = np.argsort(order, kind="stable")
+        N_s, E_s = N_s[inv], E_s[inv]
+    w_vec = _weight_vector(weights, codes)
+
+    N = N_s.sum(axis=1)
+    present = N_s > 0
+    if w_vec is not None:
+        coverage = (present * w_vec).sum(axis=1)
+    else:
+        coverage = np.where(N > 0, 1.0, 0.0)
+
+    cuts = pd.to_datetime(windows["cut"]).dt.normalize()
+    out = pd.DataFrame({
+        "Periodo": windows["Periodo"].values,
+        "cut": cuts.values,
+        "N": N.astype(int),
+        "coverage_w": np.where(N > 0, coverage, 0.0).astype(float),
+        "flag_base_baja": (N < int(min_base)) | (N == 0),
+    })
+    for j, H in enumerate(hs):
+        E = E_s[:, :, j].sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ds_raw = np.where(N > 0, E / N, np.nan)
+            p_s = np.where(present, E_s[:, :, j] / N_s, np.nan)
+            if w_vec is not None:
+                ds_std = np.where(coverage > 0, np.where(present, p_s, 0.0) @ w_vec / coverage, np.nan)
+            else:
+                ds_std = ds_raw
+        flag_incomplete = (cuts + pd.Timedelta(days=H) > ct).to_numpy(dtype=bool)
         # si es incompleto, dejamos NaN (para no engañar la tendencia)
-        if flag_incomplete:
-            ds_raw_out = np.nan
-            ds_std_out = np.nan
-        else:
-            ds_raw_out = ds_raw
-            ds_std_out = ds_std
-
-        rows.append({
-            "Periodo": w["Periodo"],
-            "cut": cut,
-            "N": N,
-            "E": E,
-            "DS30_raw": ds_raw_out,
-            "DS30_std": ds_std_out,
-            "coverage_w": coverage,
-            "flag_incomplete_30d": flag_incomplete,
-            "flag_base_baja": flag_base_baja,
-        })
-
-    out = pd.DataFrame(rows).sort_values("cut").reset_index(drop=True)
+        out[f"E{H}"] = E.astype(int)
+        out[f"DS{H}_raw"] = np.where(flag_incomplete, np.nan, ds_raw)
+        out[f"DS{H}_std"] = np.where(flag_incomplete, np.nan, ds_std)
+        out[f"flag_incomplete_{H}d"] = flag_incomplete
+    out = out.sort_values("cut").reset_index(drop=True)
     return out
 
+def ds_horizon_view(df_multi: pd.DataFrame, H_days: int) -> pd.DataFrame:
+    # columnas clásicas del KPI (N, E, DS30_raw, DS30_std, ...) para el horizonte H_days
+    if df_multi is None or df_multi.empty:
+        return pd.DataFrame()
+    H = int(H_days)
+    out = df_multi[["Periodo", "cut", "N", f"E{H}", f"DS{H}_raw", f"DS{H}_std", "coverage_w", f"flag_incomplete_{H}d", "flag_base_baja"]]
+    return out.set_axis(["Periodo", "cut", "N", "E", "DS30_raw", "DS30_std", "coverage_w", "flag_incomplete_30d", "flag_base_baja"], axis=1)
+
+@st.cache_data(show_spinner=False)
+def compute_ds30_std_by_period(
+    df_intervals: pd.DataFrame,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    period: str,
+    cut_today: pd.Timestamp,
+    weights: pd.DataFrame,
+    H_days: int = 30,
+    min_base: int = 30,
+    dims: Tuple[str, ...] = STD_STRATA_DIMS,
+    _lexis: LexisTable | None = None,
+) -> pd.DataFrame:
+    df_multi = compute_ds_multi_horizon_by_period(
+        df_intervals, start, end, period, cut_today, weights, (int(H_days),), min_base, dims, _lexis
+    )
+    return ds_horizon_view(df_multi, H_days)
+
 def meta_from_last_year_last3(df_metric: pd.DataFrame, end_dt: pd.Timestamp, value_col: str) -> float:
     if df_metric is None or df_metric.empty or value_col not in df_metric.columns:
         return np.nan
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Tuple
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.config.params import KPI_HORIZONS_DAYS, ROLLING_WINDOWS_DAYS
+from rrhh_panel.filters.index import FilterIndex
+from rrhh_panel.filters.state import FilterState
+from rrhh_panel.preprocessing.intervals import IntervalIndex
+from rrhh_panel.preprocessing.lexis import lexis_for_selection
+from rrhh_panel.metrics.existencias_salidas import compute_flows_daily_filtered, compute_existencias_salidas_by_dim
+from rrhh_panel.metrics.kpi_ds30_std_v1 import compute_ds_multi_horizon_by_period, ds_horizon_view
+from rrhh_panel.metrics.baseline import get_baseline_artifacts
+from rrhh_panel.time_windows.aggregate import aggregate_daily_to_period
+from rrhh_panel.time_windows.rolling import compute_rolling_turnover
+
+PERIODS = ("D", "W", "M", "Y")
+
+# =============================================================================
+# Pirámide D/W/M/Y: serie diaria + agregados + KPI por periodo, para una selección
+# =============================================================================
+@dataclass(frozen=True)
+class PeriodPyramid:
+    daily: pd.DataFrame                  # flujos por día (FLOW_COLS, con campos de calendario)
+    rolling: pd.DataFrame                # rotación móvil por día (ventanas de ROLLING_WINDOWS_DAYS)
+    sal_det: pd.DataFrame                # detalle de salidas en rango (mismas salidas que daily)
+    periods: Dict[str, pd.DataFrame]     # periodo -> agregado (sumas de flujos, Existencias_Prom, Existencias_Cierre)
+    kpi: Dict[str, pd.DataFrame]         # periodo -> DS30 por corte (sin MA3/Meta/flags)
+    kpi_horizons: Dict[str, pd.DataFrame]  # periodo -> DS{H} raw/std por corte para KPI_HORIZONS_DAYS
+    weights: Dict[str, pd.DataFrame]     # periodo -> pesos de baseline
+    meta: Dict[str, float]               # periodo -> meta de baseline
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_period_pyramid(
+    _ix: IntervalIndex,
+    _fidx: FilterIndex,
+    _fs: FilterState,
+    selection_fp: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    cut_today: pd.Timestamp,
+    H_days: int = 30,
+    min_base: int = 30,
+) -> PeriodPyramid:
+    # _ix/_fidx/_fs no se hashean: selection_fp = huella de (dataset, filtros); cambiar de periodo es un lookup
+    mask = _fidx.mask(_fs)
+    df_intervals = _ix.select(mask)
+    lexis = lexis_for_selection(_ix, mask)
+
+    # la serie diaria parte antes para que las ventanas móviles del rango estén completas
+    start = pd.Timestamp(start)
+    lookback = start - pd.Timedelta(days=max(ROLLING_WINDOWS_DAYS, default=1) - 1)
+
+    # Ingresos / Salidas / Existencias en una pasada sobre los intervalos (una sola serie de salidas)
+    daily, df_sal_det = compute_flows_daily_filtered(
+        df_intervals=df_intervals,
+        start=lookback,
+        end=end,
+        antig_sel=_fs.antig,
+        edad_sel=_fs.edad,
+        cut_today=cut_today,
+        _lexis=lexis,
+    )
+
+    rolling = compute_rolling_turnover(daily, ROLLING_WINDOWS_DAYS, valid_from=_ix.min_date)
+    rolling = rolling[rolling["Día"] >= start].reset_index(drop=True)
+    daily = daily[daily["Día"] >= start].reset_index(drop=True)
+    df_sal_det = df_sal_det[df_sal_det["ref_fin"] >= start].reset_index(drop=True)
+
+    periods, kpi, kpi_horizons, weights, meta = {}, {}, {}, {}, {}
+    horizons = tuple(sorted(set(KPI_HORIZONS_DAYS) | {int(H_days)}))
+    for p in PERIODS:
+        periods[p] = aggregate_daily_to_period(
+            daily, p,
+            sum_cols=("Salidas", "Ingresos", "Flujo_Neto", "Otros_Mov"),
+            mean_cols=("Existencias",),
+            last_cols=("Existencias_Cierre",),
+        )
+
+        base = get_baseline_artifacts(
+            _ix,
+            _ix.fingerprint,
+            p,
+            int(pd.Timestamp(end).year) - 1,
+            cut_today,
+            H_days=H_days,
+            min_base=min_base,
+        )
+        weights[p] = base.weights
+        meta[p] = base.meta
+        # una pasada para todos los horizontes; el KPI principal (H_days) es una vista
+        kpi_horizons[p] = compute_ds_multi_horizon_by_period(
+            df_intervals=df_intervals,
+            start=start,
+            end=end,
+            period=p,
+            cut_today=cut_today,
+            weights=base.weights,
+            horizons=horizons,
+            min_base=min_base,
+            _lexis=lexis,
+        )
+        kpi[p] = ds_horizon_view(kpi_horizons[p], H_days)
+
+    return PeriodPyramid(
+        daily=daily, rolling=rolling, sal_det=df_sal_det, periods=periods,
+        kpi=kpi, kpi_horizons=kpi_horizons, weights=weights, meta=meta,
+    )
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_dim_breakdown(
+    _ix: IntervalIndex,
+    _fidx: FilterIndex,
+    _fs: FilterState,
+    selection_fp: str,
+    dim: str,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    cut_today: pd.Timestamp,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # matrices día × categoría de dim para la selección (clave: huella de selección + dim + rango)
+    mask = _fidx.mask(_fs)
+    df_intervals = _ix.select(mask)
+    return compute_existencias_salidas_by_dim(
+        df_intervals=df_intervals,
+        start=start,
+        end=end,
+        antig_sel=_fs.antig,
+        edad_sel=_fs.edad,
+        dim=dim,
+        cut_today=cut_today,
+        _lexis=lexis_for_selection(_ix, mask),
+    )
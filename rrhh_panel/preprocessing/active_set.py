@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.preprocessing.historia_personal import person_ids
+
+# separación entre checkpoints (días): más chico = consultas más rápidas, más memoria
+ACTIVE_INDEX_STEP_DAYS = 32
+
+# =============================================================================
+# Índice de activos por fecha (eventos con ini <= D <= fin_eff)
+# =============================================================================
+@dataclass(frozen=True)
+class ActiveSetIndex:
+    ini: np.ndarray          # ini por evento (días)
+    fin: np.ndarray          # fin_eff por evento (días)
+    person: np.ndarray       # código de persona por evento
+    by_ini: np.ndarray       # posiciones ordenadas por ini
+    ini_sorted: np.ndarray   # ini[by_ini]
+    fin_sorted: np.ndarray   # fin_eff ordenado (ini - 1 si fin_eff < ini: nunca activo)
+    origin: int              # día del checkpoint 0 (= mínimo ini)
+    step: int
+    cp_rows: np.ndarray      # eventos activos en cada checkpoint (concatenados, posiciones ascendentes)
+    cp_offsets: np.ndarray   # cp_rows[cp_offsets[k]:cp_offsets[k+1]] = activos en origin + k*step
+
+    def active_rows(self, d: pd.Timestamp) -> np.ndarray:
+        # posiciones (ascendentes) de eventos activos en d: activos en el checkpoint previo que siguen
+        # + los que parten entre el checkpoint y d; costo ~ O(log n + activos)
+        day = int(np.datetime64(pd.Timestamp(d).normalize(), "D").astype("int64"))
+        if len(self.ini) == 0 or day < self.origin:
+            return np.zeros(0, dtype=np.int64)
+        k = min((day - self.origin) // self.step, len(self.cp_offsets) - 2)
+        c = self.origin + k * self.step
+
+        a = self.cp_rows[self.cp_offsets[k]:self.cp_offsets[k + 1]]
+        lo = np.searchsorted(self.ini_sorted, c, side="right")
+        hi = np.searchsorted(self.ini_sorted, day, side="right")
+        b = self.by_ini[lo:hi]
+        rows = np.concatenate([a[self.fin[a] >= day], b[self.fin[b] >= day]])
+        rows.sort()
+        return rows
+
+    def active_rows_many(self, days) -> Tuple[np.ndarray, np.ndarray]:
+        # consultas en lote: pares (índice de la fecha en days, posición del evento), ordenados por
+        # (fecha, posición) como active_rows. Las fechas se ordenan y agrupan por checkpoint; los candidatos
+        # de cada grupo (activos en el checkpoint + los que parten hasta la última fecha del grupo) se
+        # arman una vez y se filtran con ini <= d <= fin_eff para todas las fechas del grupo a la vez.
+        day = pd.to_datetime(pd.Series(days)).dt.normalize().values.astype("datetime64[D]").astype("int64")
+        z = np.zeros(0, dtype=np.int64)
+        if len(self.ini) == 0 or len(day) == 0:
+            return z, z
+        q_order = np.argsort(day, kind="stable")
+        q_order = q_order[day[q_order] >= self.origin]
+        d = day[q_order]
+        if len(d) == 0:
+            return z, z
+
+        k = np.minimum((d - self.origin) // self.step, len(self.cp_offsets) - 2)
+        first = np.r_[True, k[1:] != k[:-1]]
+        q_grp = np.cumsum(first) - 1
+        gk = k[first]
+        g_last = d[np.r_[np.flatnonzero(first)[1:], len(d)] - 1]
+
+        # candidatos por grupo, ordenados por (grupo, posición): slice del checkpoint + delta por ini
+        ga, a = _gather_ranges(self.cp_rows, self.cp_offsets[gk], self.cp_offsets[gk + 1])
+        lo = np.searchsorted(self.ini_sorted, self.origin + gk * self.step, side="right")
+        hi = np.searchsorted(self.ini_sorted, g_last, side="right")
+        gb, b = _gather_ranges(self.by_ini, lo, hi)
+        grp = np.concatenate([ga, gb])
+        cand = np.concatenate([a, b])
+        o = np.lexsort((cand, grp))
+        cand = cand[o]
+        c_off = np.searchsorted(grp[o], np.arange(len(gk) + 1))
+
+        # fecha × candidato de su grupo, filtrado: sale ordenado por (fecha ordenada, posición)
+        qs, c = _gather_ranges(np.arange(len(cand), dtype=np.int64), c_off[q_grp], c_off[q_grp + 1])
+        r = cand[c]
+        keep = (self.ini[r] <= d[qs]) & (self.fin[r] >= d[qs])
+        qs, r = qs[keep], r[keep]
+
+        # de vuelta al orden de days: bloques contiguos por fecha ordenada, reunidos sin ordenar los pares
+        cnt = np.bincount(qs, minlength=len(d))
+        start = np.cumsum(cnt) - cnt
+        inv = np.argsort(q_order, kind="stable")
+        qi, r = _gather_ranges(r, start[inv], (start + cnt)[inv])
+        return q_order[inv][qi], r
+
+    def active_counts_many(self, days) -> np.ndarray:
+        # n° de eventos activos por fecha: #(ini <= d) - #(fin_eff < d), dos búsquedas binarias por fecha
+        day = pd.to_datetime(pd.Series(days)).dt.normalize().values.astype("datetime64[D]").astype("int64")
+        return (np.searchsorted(self.ini_sorted, day, side="right") - np.searchsorted(self.fin_sorted, day, side="left")).astype(np.int64)
+
+    def latest_per_person(self, rows: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+        # por persona, el episodio activo de ini más reciente (empate: el último en el orden del dataset)
+        if mask is not None:
+            rows = rows[np.asarray(mask, dtype=bool)[rows]]
+        if len(rows) == 0:
+            return rows
+        o = np.lexsort((rows, self.ini[rows], self.person[rows]))
+        r = rows[o]
+        p = self.person[r]
+        last = np.r_[p[1:] != p[:-1], True]
+        return r[last]
+
+def _gather_ranges(arr: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # concatena arr[lo[i]:hi[i]] para todo i sin bucle: (i de cada elemento, valores)
+    cnt = np.maximum(hi - lo, 0)
+    owner = np.repeat(np.arange(len(lo), dtype=np.int64), cnt)
+    pos = np.repeat(lo - (np.cumsum(cnt) - cnt), cnt) + np.arange(int(cnt.sum()), dtype=np.int64)
+    return owner, arr[pos].astype(np.int64)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_active_set_index(_df: pd.DataFrame, fingerprint: str) -> ActiveSetIndex:
+    # _df no se hashea: la clave es la huella del dataset
+    ini = _df["ini"].values.astype("datetime64[D]").astype("int64")
+    fin = _df["fin_eff"].values.astype("datetime64[D]").astype("int64")
+    person = person_ids(_df).astype(np.int64)
+    by_ini = np.argsort(ini, kind="stable")
+    step = int(ACTIVE_INDEX_STEP_DAYS)
+
+    if len(ini) == 0:
+        z = np.zeros(0, dtype=np.int64)
+        return ActiveSetIndex(ini, fin, person, by_ini, ini[by_ini], fin, 0, step, z, np.zeros(2, dtype=np.int64))
+
+    origin = int(ini.min())
+    n_cp = int((max(fin.max(), ini.max()) - origin) // step) + 1
+
+    # checkpoints k con ini <= origin + k*step <= fin, expandidos por evento
+    k0 = -((origin - ini) // step)          # ceil((ini - origin) / step)
+    k1 = np.minimum((fin - origin) // step, n_cp - 1)
+    cnt = np.maximum(k1 - k0 + 1, 0)
+    pos = np.repeat(np.arange(len(ini), dtype=np.int64), cnt)
+    k = np.repeat(k0, cnt) + (np.arange(int(cnt.sum())) - np.repeat(np.cumsum(cnt) - cnt, cnt))
+    o = np.argsort(k, kind="stable")       # estable: posiciones ascendentes dentro de cada checkpoint
+    offsets = np.r_[0, np.cumsum(np.bincount(k, minlength=n_cp))]
+
+    return ActiveSetIndex(
+        ini=ini,
+        fin=fin,
+        person=person,
+        by_ini=by_ini,
+        ini_sorted=ini[by_ini],
+        fin_sorted=np.sort(np.where(fin >= ini, fin, ini - 1)),
+        origin=origin,
+        step=step,
+        cp_rows=pos[o],
+        cp_offsets=offsets,
+    )
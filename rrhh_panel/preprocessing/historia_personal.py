@@ -1,12 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from typing import Tuple, Dict, Any, List
+from typing import Tuple, Dict, Any
 import numpy as np
 import pandas as pd
 import streamlit as st
 
-from rrhh_panel.schema.historia_personal import REQUIRED_COLS, R_COL_CANDIDATES, COL_MAP, KEEP_INTERNAL, MISSING_LABEL
+from rrhh_panel.schema.historia_personal import REQUIRED_COLS, R_COL_CANDIDATES, COL_MAP, KEEP_INTERNAL, MISSING_LABEL, DIM_COLS
 from rrhh_panel.references.areas import AREA_REF
 from rrhh_panel.references.clasificacion import CLAS_REF
 from rrhh_panel.utils.dates import to_datetime_norm, today_dt
@@ -32,6 +32,22 @@ def map_clas(clas_raw: pd.Series) -> pd.Series:
     std = std.fillna(key).replace({"": pd.NA}).fillna(MISSING_LABEL).astype("string")
     return std
 
+# =============================================================================
+# Dimensiones como category
+# =============================================================================
+def as_dim_category(s: pd.Series) -> pd.Series:
+    # diccionario estable (categorías ordenadas) con MISSING_LABEL siempre presente
+    s = s.astype("string").fillna(MISSING_LABEL)
+    cats = sorted(set(s.unique().tolist()) | {MISSING_LABEL})
+    return s.astype(pd.CategoricalDtype(categories=cats))
+
+def person_ids(df: pd.DataFrame) -> np.ndarray:
+    # id entero denso de persona (int32 cuando cod es category)
+    s = df["cod"]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy().astype(np.int32, copy=False)
+    return pd.factorize(s)[0].astype(np.int32)
+
 # =============================================================================
 # Preparación de Historia Personal
 # =============================================================================
@@ -67,7 +83,9 @@ def validate_and_prepare_hist(df_raw: pd.DataFrame) -> pd.DataFrame:
 
     out = out[~out["cod"].isna()].copy()
     out = out[~out["ini"].isna()].copy()
-    out["cod"] = out["cod"].astype(str)
+    # cod como category: los códigos son el id entero denso de persona (person_ids)
+    # y las categorías, el diccionario con el código original (para exportar)
+    out["cod"] = out["cod"].astype(str).astype("category")
 
     rp = out["r_pct"].copy()
     if rp.dtype == "object" or str(rp.dtype).startswith("string"):
@@ -83,6 +101,9 @@ def validate_and_prepare_hist(df_raw: pd.DataFrame) -> pd.DataFrame:
     out["area"], out["area_gen"] = map_area(out["area_raw"])
     out["clas"] = map_clas(out["clas_raw"])
 
+    for c in DIM_COLS:
+        out[c] = as_dim_category(out[c])
+
     out = out[KEEP_INTERNAL].copy()
     out = out.sort_values(["cod", "ini", "fin_eff"]).reset_index(drop=True)
     return out
@@ -90,40 +111,59 @@ def validate_and_prepare_hist(df_raw: pd.DataFrame) -> pd.DataFrame:
 # =============================================================================
 # Intervalos por persona (para existencias diarias y KPI)
 # =============================================================================
+def _merged_block_ids(person: np.ndarray, ini: np.ndarray, fin: np.ndarray) -> np.ndarray:
+    # person/ini/fin ya ordenados por (persona, ini, fin_eff); ini/fin en días (int64).
+    # Un bloque nuevo parte cuando cambia la persona o cuando ini supera el
+    # máximo acumulado de fin_eff (de la misma persona) + 1 día de tolerancia.
+    n = len(person)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    new_person = np.ones(n, dtype=bool)
+    new_person[1:] = person[1:] != person[:-1]
+
+    # cummax por persona sin groupby: desplazamos cada persona a su propio tramo
+    span = int(fin.max() - fin.min()) + 2
+    pid = np.cumsum(new_person) - 1
+    run_max = np.maximum.accumulate(pid * span + (fin - fin.min())) - pid * span + fin.min()
+
+    starts = new_person.copy()
+    starts[1:] |= ini[1:] > (run_max[:-1] + 1)
+    return np.cumsum(starts) - 1
+
+def interval_sort_keys(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # persona en orden de aparición (mismo orden que groupby(sort=False)); fechas en días
+    person, _ = pd.factorize(df["cod"])
+    ini = df["ini"].values.astype("datetime64[D]").astype("int64")
+    fin = df["fin_eff"].values.astype("datetime64[D]").astype("int64")
+    return person, ini, fin
+
+def merge_sorted_intervals(
+    df: pd.DataFrame,
+    order: np.ndarray,
+    person: np.ndarray,
+    ini: np.ndarray,
+    fin: np.ndarray,
+) -> Tuple[pd.DataFrame, np.ndarray]:
+    # order: posiciones de df ya ordenadas por (persona, ini, fin_eff), puede ser un subconjunto
+    block = _merged_block_ids(person[order], ini[order], fin[order])
+
+    # por bloque: ini del primer evento, máximo fin_eff, y la fila del último evento
+    first = np.r_[True, block[1:] != block[:-1]]
+    last = np.r_[block[1:] != block[:-1], True]
+    fin_max = np.maximum.reduceat(df["fin_eff"].values[order], np.flatnonzero(first))
+
+    out = df.iloc[order[last]].copy()
+    out["ini"] = df["ini"].values[order[first]]
+    out["fin_eff"] = fin_max
+    return out.reset_index(drop=True), block
+
 @st.cache_data(show_spinner=False)
 def merge_intervals_per_person(df: pd.DataFrame) -> pd.DataFrame:
-    rows: List[pd.Series] = []
-    for cod, g in df.groupby("cod", sort=False):
-        g = g.sort_values(["ini", "fin_eff"]).copy()
-        cur_ini = None
-        cur_fin = None
-        cur_row = None
-
-        for _, r in g.iterrows():
-            ini = r["ini"]
-            fin = r["fin_eff"]
-            if cur_ini is None:
-                cur_ini, cur_fin = ini, fin
-                cur_row = r
-                continue
-
-            if ini <= (cur_fin + pd.Timedelta(days=1)):
-                if fin > cur_fin:
-                    cur_fin = fin
-                cur_row = r
-            else:
-                out_r = cur_row.copy()
-                out_r["ini"] = cur_ini
-                out_r["fin_eff"] = cur_fin
-                rows.append(out_r)
-
-                cur_ini, cur_fin = ini, fin
-                cur_row = r
-
-        if cur_ini is not None:
-            out_r = cur_row.copy()
-            out_r["ini"] = cur_ini
-            out_r["fin_eff"] = cur_fin
-            rows.append(out_r)
-
-    return pd.DataFrame(rows).reset_index(drop=True)
+    if df is None or df.empty:
+        return pd.DataFrame(columns=list(df.columns) if df is not None else [])
+
+    person, ini, fin = interval_sort_keys(df)
+    order = np.lexsort((fin, ini, person))
+    out, _ = merge_sorted_intervals(df, order, person, ini, fin)
+    return out
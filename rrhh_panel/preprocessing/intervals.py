@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.preprocessing.historia_personal import interval_sort_keys, merge_sorted_intervals
+from rrhh_panel.utils.fingerprint import frame_fingerprint
+
+# =============================================================================
+# Índice de intervalos (una vez por dataset, independiente de los filtros)
+# =============================================================================
+@dataclass(frozen=True)
+class IntervalIndex:
+    events: pd.DataFrame          # Historia Personal preparada (df0)
+    intervals: pd.DataFrame       # intervalos fusionados sobre todos los eventos
+    order: np.ndarray             # posiciones de events ordenadas por (persona, ini, fin_eff)
+    person: np.ndarray            # código de persona por evento
+    ini_days: np.ndarray          # ini por evento (días)
+    fin_days: np.ndarray          # fin_eff por evento (días)
+    event_interval: np.ndarray    # evento -> intervalo (posición en intervals)
+    interval_size: np.ndarray     # n° de eventos por intervalo
+    fingerprint: str              # huella del dataset (clave de cachés derivados)
+
+    @property
+    def min_date(self) -> pd.Timestamp:
+        return self.intervals["ini"].min() if not self.intervals.empty else pd.NaT
+
+    @property
+    def max_date(self) -> pd.Timestamp:
+        return self.intervals["fin_eff"].max() if not self.intervals.empty else pd.NaT
+
+    def interval_rows(self, event_mask: np.ndarray | None) -> np.ndarray | None:
+        # máscara sobre intervals si el filtro toma o deja intervalos completos; None si alguno queda parcial
+        if event_mask is None:
+            return np.ones(len(self.intervals), dtype=bool)
+        m = np.asarray(event_mask, dtype=bool)
+        n_sel = np.bincount(self.event_interval, weights=m, minlength=len(self.intervals))
+        if ((n_sel == 0) | (n_sel == self.interval_size)).all():
+            return n_sel > 0
+        return None
+
+    def select(self, event_mask: np.ndarray | None) -> pd.DataFrame:
+        # mismo resultado que merge_intervals_per_person(events[event_mask]), sin re-fusionar
+        if event_mask is None:
+            return self.intervals
+        m = np.asarray(event_mask, dtype=bool)
+        if m.all():
+            return self.intervals
+        if not m.any():
+            return self.intervals.iloc[0:0].copy()
+
+        keep = self.interval_rows(m)
+        if keep is not None:
+            # el filtro toma o deja intervalos completos: basta una máscara de filas
+            return self.intervals[keep].reset_index(drop=True)
+
+        # algún intervalo quedó parcial: se re-bloquea sobre los eventos ya ordenados (sin sort)
+        out, _ = merge_sorted_intervals(self.events, self.order[m[self.order]], self.person, self.ini_days, self.fin_days)
+        return out
+
+@st.cache_resource(show_spinner=False)
+def build_interval_index(df: pd.DataFrame) -> IntervalIndex:
+    if df is None or df.empty:
+        empty = np.zeros(0, dtype=np.int64)
+        return IntervalIndex(
+            events=df,
+            intervals=pd.DataFrame(columns=list(df.columns) if df is not None else []),
+            order=empty, person=empty, ini_days=empty, fin_days=empty,
+            event_interval=empty, interval_size=empty, fingerprint="",
+        )
+
+    person, ini, fin = interval_sort_keys(df)
+    order = np.lexsort((fin, ini, person))
+    intervals, block = merge_sorted_intervals(df, order, person, ini, fin)
+
+    event_interval = np.empty(len(df), dtype=np.int64)
+    event_interval[order] = block
+
+    return IntervalIndex(
+        events=df,
+        intervals=intervals,
+        order=order,
+        person=person,
+        ini_days=ini,
+        fin_days=fin,
+        event_interval=event_interval,
+        interval_size=np.bincount(block, minlength=len(intervals)),
+        fingerprint=frame_fingerprint(df),
+    )
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Dict, List, Tuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rrhh_panel.features.buckets import AGE_BUCKETS, TENURE_BUCKETS, bucket_categories, bucket_codes
+from rrhh_panel.preprocessing.intervals import IntervalIndex
+from rrhh_panel.utils.dates import years_offset_days
+
+_NO_CUT = np.iinfo(np.int64).max
+
+# =============================================================================
+# Tabla persona-periodo (Lexis): cada intervalo partido en cada borde de edad y antigüedad
+# =============================================================================
+@dataclass(frozen=True)
+class LexisTable:
+    s: np.ndarray          # inicio del tramo (días, int32)
+    e: np.ndarray          # fin del tramo (días, int32)
+    pos: np.ndarray        # posición del intervalo (int32); tramos ordenados por (pos, s)
+    edad: np.ndarray       # código de bucket de edad (posición en AGE_BUCKETS; SIN DATO al final)
+    antig: np.ndarray      # código de bucket de antigüedad (posición en TENURE_BUCKETS)
+    offsets: np.ndarray    # tramos del intervalo i: [offsets[i], offsets[i+1])
+
+    @property
+    def n_intervals(self) -> int:
+        return len(self.offsets) - 1
+
+    def take(self, keep: np.ndarray) -> LexisTable:
+        # subtabla de los intervalos keep (máscara), renumerando pos como en intervals[keep]
+        keep = np.asarray(keep, dtype=bool)
+        if keep.all():
+            return self
+        m = keep[self.pos]
+        new_pos = (np.cumsum(keep) - 1).astype(np.int32)
+        sizes = np.diff(self.offsets)[keep]
+        return LexisTable(
+            s=self.s[m], e=self.e[m], pos=new_pos[self.pos[m]], edad=self.edad[m], antig=self.antig[m],
+            offsets=np.r_[0, np.cumsum(sizes)].astype(np.int64),
+        )
+
+    def mask(self, antig_sel: List[str], edad_sel: List[str]) -> np.ndarray:
+        # tramos cuyos buckets están en la selección (lista vacía = sin filtro)
+        out = np.ones(len(self.s), dtype=bool)
+        for sel, codes, buckets in ((antig_sel, self.antig, TENURE_BUCKETS), (edad_sel, self.edad, AGE_BUCKETS)):
+            if sel:
+                allowed = np.asarray(bucket_categories(buckets).categories.isin(sel))
+                out &= allowed[codes]
+        return out
+
+    @cached_property
+    def _key(self) -> np.ndarray:
+        # (pos, s) en un int64 ordenado, para búsquedas binarias
+        return (self.pos.astype(np.int64) << 32) + (self.s.astype(np.int64) + 2**31)
+
+    def locate(self, pos: np.ndarray, days: np.ndarray) -> np.ndarray:
+        # tramo del intervalo pos que contiene el día; -1 si el día cae fuera del intervalo
+        pos = np.asarray(pos, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        i = np.searchsorted(self._key, (pos << 32) + (days + 2**31), side="right") - 1
+        j = np.maximum(i, 0)
+        ok = (i >= 0) & (self.pos[j] == pos) & (self.e[j] >= days)
+        return np.where(ok, i, -1)
+
+def _bucket_cut_offsets(buckets: Dict[str, Tuple[int | None, int | None]]) -> np.ndarray:
+    # bordes (inicio de un bucket o fin + 1) en las unidades del diccionario, sin el origen
+    b = {a for a, _ in buckets.values() if a is not None} | {z + 1 for _, z in buckets.values() if z is not None}
+    return np.array(sorted(x for x in b if x > 0), dtype=np.int64)
+
+def lexis_split(df_int: pd.DataFrame) -> LexisTable:
+    # Parte cada intervalo [ini, fin_eff] en los cumpleaños de borde de edad (cumpleaños calendario,
+    # como bucket_edad_from_dob) y en ini + borde de antigüedad; cada tramo tiene buckets constantes.
+    n = len(df_int)
+    ini = df_int["ini"].values.astype("datetime64[D]").astype("int64")
+    fin = df_int["fin_eff"].values.astype("datetime64[D]").astype("int64")
+
+    tenure_cuts = ini[:, None] + _bucket_cut_offsets(TENURE_BUCKETS)[None, :]
+    age_years = _bucket_cut_offsets(AGE_BUCKETS)
+    dob = df_int["fnac"].values.astype("datetime64[D]") if "fnac" in df_int.columns else np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+    dob_ok = ~np.isnat(dob)
+    dob_fill = np.where(dob_ok, dob, np.datetime64("2000-01-01", "D"))
+    age_cuts = np.stack([years_offset_days(dob_fill, y, feb29_to_mar1=True).astype("int64") for y in age_years], axis=1) \
+        if len(age_years) else np.zeros((n, 0), dtype=np.int64)
+    age_cuts[~dob_ok] = _NO_CUT
+
+    # cortes dentro de (ini, fin_eff], ordenados y sin repetir por fila; la columna 0 es ini
+    cuts = np.concatenate([tenure_cuts, age_cuts], axis=1)
+    cuts = np.sort(np.where((cuts > ini[:, None]) & (cuts <= fin[:, None]), cuts, _NO_CUT), axis=1)
+    starts = np.concatenate([ini[:, None], cuts], axis=1)
+    valid = starts != _NO_CUT
+    valid[:, 1:] &= starts[:, 1:] != starts[:, :-1]
+    valid &= (ini <= fin)[:, None]
+
+    s = starts[valid]
+    pos = np.repeat(np.arange(n, dtype=np.int64), valid.sum(axis=1))
+    last = np.r_[pos[1:] != pos[:-1], True] if len(pos) else np.zeros(0, dtype=bool)
+    e = np.where(last, fin[pos], np.r_[s[1:], 0] - 1)
+
+    # códigos al inicio del tramo: antigüedad = s - ini; edad = último borde de edad cumplido
+    antig = bucket_codes(s - ini[pos], np.ones(len(s), dtype=bool), TENURE_BUCKETS)
+    n_age = (age_cuts[pos] <= s[:, None]).sum(axis=1)
+    age_rep = np.where(n_age > 0, np.r_[age_years, 0][n_age - 1], (age_years[0] if len(age_years) else 0) - 1)
+    edad = bucket_codes(age_rep, dob_ok[pos], AGE_BUCKETS)
+
+    return LexisTable(
+        s=s.astype(np.int32),
+        e=e.astype(np.int32),
+        pos=pos.astype(np.int32),
+        edad=edad,
+        antig=antig,
+        offsets=np.r_[0, np.cumsum(valid.sum(axis=1))].astype(np.int64),
+    )
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_lexis_table(_ix: IntervalIndex, fingerprint: str) -> LexisTable:
+    # una vez por dataset sobre todos los intervalos fusionados (_ix no se hashea)
+    return lexis_split(_ix.intervals)
+
+def lexis_for_selection(ix: IntervalIndex, event_mask: np.ndarray | None) -> LexisTable:
+    # tabla alineada con ix.select(event_mask): subtabla si el filtro toma intervalos completos,
+    # si no se parte la selección re-fusionada
+    keep = ix.interval_rows(event_mask)
+    if keep is None:
+        return lexis_split(ix.select(event_mask))
+    return build_lexis_table(ix, ix.fingerprint).take(keep)
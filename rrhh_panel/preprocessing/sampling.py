@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from rrhh_panel.preprocessing.historia_personal import person_ids
+
+# =============================================================================
+# Muestra estratificada de personas (por cod): todos los eventos de cada persona elegida
+# =============================================================================
+def person_sample_mask(df: pd.DataFrame, frac: float, strata_col: str | None = None) -> np.ndarray:
+    # Máscara de eventos. Estrato de la persona = strata_col en su último evento (por ini); dentro de
+    # cada estrato se eligen las primeras floor(frac * n + u) personas según un hash estable del cod,
+    # con u en [0, 1) derivado del hash del estrato (redondeo aleatorio): toda persona entra con
+    # probabilidad exactamente frac, también en estratos chicos, y 1/frac es un peso insesgado.
+    n = len(df)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    if frac >= 1.0:
+        return np.ones(n, dtype=bool)
+
+    pid = person_ids(df).astype(np.int64)
+    n_p = int(pid.max()) + 1
+    codes, uniques = pd.factorize(df["cod"])
+    h_event = pd.util.hash_array(np.asarray(pd.Index(uniques).astype(str), dtype=object))[codes]
+    h = np.zeros(n_p, dtype=np.uint64)
+    h[pid] = h_event
+
+    present = np.zeros(n_p, dtype=bool)
+    present[pid] = True
+    stratum = np.zeros(n_p, dtype=np.int64)
+    labels = [""]
+    if strata_col and strata_col in df.columns:
+        # último evento por persona: orden estable por (persona, ini)
+        ini = df["ini"].values.astype("datetime64[D]").astype(np.int64)
+        o = np.lexsort((ini, pid))
+        last = o[np.r_[pid[o][1:] != pid[o][:-1], True]]
+        s_codes, s_uniques = pd.factorize(df[strata_col])
+        stratum[pid[last]] = s_codes[last] + 1
+        labels += [f"{strata_col}={v}" for v in s_uniques]
+    u_stratum = pd.util.hash_array(np.asarray(labels, dtype=object)).astype(np.float64) / 2.0**64
+
+    people = np.flatnonzero(present)
+    o = np.lexsort((h[people], stratum[people]))
+    p_sorted = people[o]
+    s_sorted = stratum[p_sorted]
+    first = np.r_[True, s_sorted[1:] != s_sorted[:-1]]
+    grp_start = np.maximum.accumulate(np.where(first, np.arange(len(p_sorted)), 0))
+    rank = np.arange(len(p_sorted)) - grp_start
+    grp_size = np.bincount(np.cumsum(first) - 1)[np.cumsum(first) - 1]
+    take = rank < np.floor(frac * grp_size + u_stratum[s_sorted])
+
+    keep = np.zeros(n_p, dtype=bool)
+    keep[p_sorted[take]] = True
+    return keep[pid]
@@ -5,6 +5,9 @@ from __future__ import annotations
 # Contrato de datos — Historia Personal
 # =============================================================================
 
+# subir cuando cambie la preparación (invalida la caché en disco)
+SCHEMA_VERSION = 3
+
 REQUIRED_COLS = [
     "Código Personal",
     "Fecha Inicio Evento",
@@ -21,6 +24,14 @@ REQUIRED_COLS = [
     "Región Registro",
 ]
 
+DATE_COLS = ["Fecha Inicio Evento", "Fecha Fin Evento", "Fecha Nacimiento"]
+
+# columnas de dimensión (cardinalidad baja): se leen como category
+DIM_RAW_COLS = [
+    "Clasificación", "Sexo", "TS_Responsable", "Empresa", "Área Original",
+    "Cargo Actual", "Nacionalidad", "Lugar Registro", "Región Registro",
+]
+
 R_COL_CANDIDATES = ["%R", "% R", "R", "R%", "Porcentaje R", "PorcentajeR", "Factor R", "FactorR"]
 
 COL_MAP = {
@@ -41,6 +52,9 @@ COL_MAP = {
 
 MISSING_LABEL = "SIN DATO"
 
+# dimensiones internas guardadas como category (MISSING_LABEL es una categoría real)
+DIM_COLS = ["sexo", "ts", "emp", "area", "area_gen", "cargo", "nac", "lug", "reg", "clas"]
+
 KEEP_INTERNAL = [
     "cod", "ini", "fin", "fin_eff", "fnac",
     "r_pct",
@@ -1,43 +1,78 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+from typing import Tuple
 import numpy as np
 import pandas as pd
 import streamlit as st
 
 from rrhh_panel.utils.dates import add_calendar_fields
 
+# =============================================================================
+# Agregación diaria -> periodo por tramos (reduceat), varias medidas a la vez
+# =============================================================================
+PERIOD_KEY = {"D": "Día", "W": "CodSem", "M": "CodMes", "Y": "Año"}
+PERIOD_CUT = {"D": "Día", "W": "FinSemana", "M": "FinMes", "Y": "Día"}
+
 @st.cache_data(show_spinner=False)
-def aggregate_daily_to_period_simple(df_daily: pd.DataFrame, period: str) -> pd.DataFrame:
-    d = df_daily.copy()
+def aggregate_daily_to_period(
+    df_daily: pd.DataFrame,
+    period: str,
+    sum_cols: Tuple[str, ...] = (),
+    mean_cols: Tuple[str, ...] = (),
+    last_cols: Tuple[str, ...] = (),
+) -> pd.DataFrame:
+    # sum_cols -> suma por periodo (mismo nombre); mean_cols -> promedio diario ("<col>_Prom");
+    # last_cols -> valor del último día del periodo (mismo nombre; p.ej. stock al cierre)
+    key = PERIOD_KEY[period]
+    cut_col = PERIOD_CUT[period]
+    out_cols = ["Periodo", "cut", "window_start", "window_end"] + list(sum_cols) + [f"{c}_Prom" for c in mean_cols] + list(last_cols)
+    if df_daily is None or df_daily.empty:
+        return pd.DataFrame(columns=out_cols)
+
+    d = df_daily
     if "CodSem" not in d.columns or "CodMes" not in d.columns or "Año" not in d.columns:
         d = add_calendar_fields(d, "Día")
+    d = d.sort_values("Día", kind="stable")
+
+    # días ordenados => cada periodo es un tramo contiguo de clave constante
+    k = d[key].to_numpy()
+    first = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    n = np.diff(np.r_[first, len(k)])
 
-    key = {"D": "Día", "W": "CodSem", "M": "CodMes", "Y": "Año"}[period]
-    cut_col = {"D": "Día", "W": "FinSemana", "M": "FinMes", "Y": "Día"}[period]
-
-    def _agg(g: pd.DataFrame) -> pd.Series:
-        ws = g["Día"].min()
-        we = g["Día"].max()
-        cut = g[cut_col].max() if cut_col in g.columns else we
-        sal = float(np.nansum(g["Salidas"].astype(float).values)) if "Salidas" in g.columns else 0.0
-        exist_prom = float(np.nanmean(g["Existencias"].astype(float).values)) if "Existencias" in g.columns else np.nan
-        return pd.Series({
-            "window_start": ws,
-            "window_end": we,
-            "cut": cut,
-            "Salidas": sal,
-            "Existencias_Prom": exist_prom,
-        })
-
-    out = d.groupby(key, dropna=False, as_index=False).apply(_agg).reset_index(drop=True)
+    day = d["Día"].to_numpy()
+    out = pd.DataFrame({
+        "window_start": np.minimum.reduceat(day, first),
+        "window_end": np.maximum.reduceat(day, first),
+    })
+    out["cut"] = np.maximum.reduceat(d[cut_col].to_numpy(), first) if cut_col in d.columns else out["window_end"]
+
+    for c in sum_cols:
+        v = d[c].to_numpy(dtype=float) if c in d.columns else np.zeros(len(d))
+        out[c] = np.add.reduceat(np.nan_to_num(v), first)
+    for c in mean_cols:
+        if c not in d.columns:
+            out[f"{c}_Prom"] = np.nan
+            continue
+        v = d[c].to_numpy(dtype=float)
+        ok = ~np.isnan(v)
+        cnt = np.add.reduceat(ok.astype(np.int64), first)
+        tot = np.add.reduceat(np.where(ok, v, 0.0), first)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[f"{c}_Prom"] = np.where(cnt > 0, tot / cnt, np.nan)
+    last = np.r_[first[1:], len(d)] - 1
+    for c in last_cols:
+        out[c] = d[c].to_numpy(dtype=float)[last] if c in d.columns else np.nan
 
     if period == "D":
         out["Periodo"] = pd.to_datetime(out["window_start"]).dt.strftime("%Y-%m-%d")
     elif period in ("W", "M"):
-        out["Periodo"] = out[key].astype(str)
+        out["Periodo"] = k[first].astype(str)
     else:
-        out["Periodo"] = out[key].astype(int).astype(str)
+        out["Periodo"] = k[first].astype(int).astype(str)
+
+    out = out.sort_values("cut", kind="stable").reset_index(drop=True)
+    return out[out_cols]
 
-    out = out.sort_values("cut").reset_index(drop=True)
-    return out[["Periodo", "cut", "window_start", "window_end", "Salidas", "Existencias_Prom"]]
+def aggregate_daily_to_period_simple(df_daily: pd.DataFrame, period: str) -> pd.DataFrame:
+    return aggregate_daily_to_period(df_daily, period, sum_cols=("Salidas",), mean_cols=("Existencias",))
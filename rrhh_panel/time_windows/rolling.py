@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from typing import Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+# =============================================================================
+# Ventanas móviles sobre la serie diaria vía sumas acumuladas (O(días) por ventana)
+# =============================================================================
+def prefix_window_sums(x: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    # suma y n° de días de la ventana [i-window+1, i] para cada día i (recortada al inicio)
+    x = np.nan_to_num(np.asarray(x, dtype=float))
+    cs = np.r_[0.0, np.cumsum(x)]
+    i = np.arange(len(x))
+    i0 = np.maximum(i - int(window) + 1, 0)
+    return cs[i + 1] - cs[i0], i + 1 - i0
+
+def compute_rolling_turnover(
+    df_daily: pd.DataFrame,
+    windows_days: Sequence[int],
+    valid_from: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    # Por ventana w: Salidas_wD, Existencias_Prom_wD y Rotacion_wD = salidas / existencias promedio.
+    # df_daily debe traer días consecutivos (Día, Salidas, Existencias). Si la ventana no cabe en
+    # la serie o parte antes de valid_from (inicio de los datos), queda NaN.
+    d = df_daily.sort_values("Día", kind="stable")
+    day = pd.to_datetime(d["Día"]).dt.normalize()
+    out = pd.DataFrame({"Día": day.to_numpy()})
+    if d.empty:
+        return out
+
+    sal = d["Salidas"].to_numpy(dtype=float)
+    ex = d["Existencias"].to_numpy(dtype=float)
+    for w in windows_days:
+        w = int(w)
+        s_sum, n = prefix_window_sums(sal, w)
+        e_sum, _ = prefix_window_sums(ex, w)
+        full = n == w
+        if valid_from is not None and pd.notna(valid_from):
+            full &= (day - pd.Timedelta(days=w - 1) >= pd.Timestamp(valid_from).normalize()).to_numpy()
+
+        e_avg = np.where(full, e_sum / np.maximum(n, 1), np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(e_avg > 0, s_sum / e_avg, np.nan)
+        out[f"Salidas_{w}D"] = np.where(full, s_sum, np.nan)
+        out[f"Existencias_Prom_{w}D"] = e_avg
+        out[f"Rotacion_{w}D"] = rate
+    return out
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import numpy as np
 import pandas as pd
-from rrhh_panel.utils.dates import add_calendar_fields
+from rrhh_panel.utils.dates import calendar_for
 
 def build_period_windows(start: pd.Timestamp, end: pd.Timestamp, period: str) -> pd.DataFrame:
-    days = pd.date_range(start, end, freq="D")
-    cal = add_calendar_fields(pd.DataFrame({"Día": days}), "Día")
+    days = pd.Series(pd.date_range(start, end, freq="D"))
+    cal, off = calendar_for(days)
+    cal = cal.iloc[off].reset_index(drop=True)
 
     if period == "D":
         w = cal[["Día"]].copy()
@@ -16,31 +18,23 @@ def build_period_windows(start: pd.Timestamp, end: pd.Timestamp, period: str) ->
         w["Periodo"] = w["Día"].dt.strftime("%Y-%m-%d")
         return w[["Periodo", "cut", "window_start", "window_end"]]
 
-    if period == "W":
-        w = cal.groupby("CodSem", as_index=False).agg(
-            window_start=("Día", "min"),
-            window_end=("Día", "max"),
-            cut=("FinSemana", "max"),
-        )
-        w["Periodo"] = w["CodSem"].astype(str)
-        return w[["Periodo", "cut", "window_start", "window_end"]].sort_values("cut")
+    if period not in ("W", "M", "Y"):
+        raise ValueError("period inválido")
 
-    if period == "M":
-        w = cal.groupby("CodMes", as_index=False).agg(
-            window_start=("Día", "min"),
-            window_end=("Día", "max"),
-            cut=("FinMes", "max"),
-        )
-        w["Periodo"] = w["CodMes"].astype(str)
-        return w[["Periodo", "cut", "window_start", "window_end"]].sort_values("cut")
+    # los días son contiguos: cada periodo es un tramo de código constante (sin groupby)
+    key, cut_col, label_col = {
+        "W": ("sem_id", "FinSemana", "CodSem"),
+        "M": ("mes_id", "FinMes", "CodMes"),
+        "Y": ("Año", "Día", "Año"),
+    }[period]
+    code = cal[key].to_numpy()
+    first = np.flatnonzero(np.r_[True, code[1:] != code[:-1]]) if len(code) else np.zeros(0, dtype=np.int64)
+    last = np.r_[first[1:] - 1, len(code) - 1] if len(code) else first
 
-    if period == "Y":
-        w = cal.groupby("Año", as_index=False).agg(
-            window_start=("Día", "min"),
-            window_end=("Día", "max"),
-            cut=("Día", "max"),
-        )
-        w["Periodo"] = w["Año"].astype(int).astype(str)
-        return w[["Periodo", "cut", "window_start", "window_end"]].sort_values("cut")
-
-    raise ValueError("period inválido")
+    w = pd.DataFrame({
+        "Periodo": cal[label_col].to_numpy()[first].astype(str),
+        "cut": cal[cut_col].to_numpy()[last],
+        "window_start": cal["Día"].to_numpy()[first],
+        "window_end": cal["Día"].to_numpy()[last],
+    })
+    return w.sort_values("cut", kind="stable")
@@ -2,29 +2,30 @@
 from __future__ import annotations
 
 import io
-from datetime import date
 import numpy as np
 import pandas as pd
 import streamlit as st
 
-from rrhh_panel.config.params import H_DAYS, MIN_BASE_KPI, MIN_COVERAGE_W
-from rrhh_panel.filters.apply import apply_categorical_filters
-from rrhh_panel.preprocessing.historia_personal import merge_intervals_per_person
-from rrhh_panel.metrics.existencias_salidas import compute_salidas_daily_filtered, compute_existencias_daily_filtered_fast
-from rrhh_panel.time_windows.aggregate import aggregate_daily_to_period_simple
-from rrhh_panel.utils.dates import add_calendar_fields
-from rrhh_panel.metrics.kpi_ds30_std_v1 import (
-    compute_standard_weights_from_baseline,
-    compute_ds30_std_by_period,
-    meta_from_last_year_last3,
+from rrhh_panel.config.params import (
+    APPROX_SAMPLE_FRAC, H_DAYS, KPI_HORIZONS_DAYS, MIN_BASE_KPI, MIN_COVERAGE_W, ROLLING_WINDOWS_DAYS,
 )
-from rrhh_panel.viz.dashboard_figs import fig_kpi_ds30, fig_exist_salidas
+from rrhh_panel.metrics.pyramid import get_period_pyramid, get_dim_breakdown
+from rrhh_panel.metrics.approx import build_approx_sample, scale_counts, scale_pyramid
+from rrhh_panel.time_windows.aggregate import aggregate_daily_to_period
+from rrhh_panel.descriptives.topn import collapse_columns_otros
+from rrhh_panel.utils.dates import add_calendar_fields
+from rrhh_panel.utils.fingerprint import selection_fingerprint
+from rrhh_panel.viz.dashboard_figs import fig_kpi_ds30, fig_exist_salidas, fig_rolling_turnover, fig_flujos, fig_stacked_area, fig_ds_horizons
 from rrhh_panel.utils.formatting import fmt_es, fmt_int_es
 from rrhh_panel.utils.safe import safe_table_for_streamlit
-from rrhh_panel.config.texts import MSG_NO_DATA_FOR_VIEW
+from rrhh_panel.config.texts import (
+    MSG_NO_DATA_FOR_VIEW, MSG_APPROX_ON, MSG_APPROX_EXACT, LBL_BREAKDOWN_DIM, LBL_BREAKDOWN_NONE, BTN_APPROX_EXACT,
+)
 
 def render_dashboard(*, g: dict, fs, opts: dict) -> None:
     df0 = g["df0"]
+    ix = g["ix"]
+    fidx = g["fidx"]
     start_dt = g["start_dt"]
     end_dt = g["end_dt"]
     period = g["period"]
@@ -33,96 +34,73 @@ def render_dashboard(*, g: dict, fs, opts: dict) -> None:
     min_date = g["min_date"]
     max_date = g["max_date"]
 
-    unique_personas_por_dia = bool(opts["unique_personas_por_dia"])
     show_labels = bool(opts["show_labels"])
     topn = int(opts["topn"])
 
-    # 1) Filtros categóricos
-    df0_f = apply_categorical_filters(df0, fs)
-    if df0_f.empty:
+    # 1) Filtros categóricos (bitmaps sobre eventos; los intervalos salen del índice)
+    if fidx.count(fs) == 0:
         st.warning(MSG_NO_DATA_FOR_VIEW)
         st.stop()
 
-    # 2) Series diarias Existencias/Salidas
-    with st.spinner("Calculando existencias y salidas..."):
-        df_intervals_f = merge_intervals_per_person(df0_f)
-
-        df_sal_daily, df_sal_det = compute_salidas_daily_filtered(
-            df_events=df0_f,
-            start=start_dt,
-            end=end_dt,
-            antig_sel=fs.antig,
-            edad_sel=fs.edad,
-            unique_personas_por_dia=unique_personas_por_dia,
-        )
-        df_exist_daily = compute_existencias_daily_filtered_fast(
-            df_intervals=df_intervals_f,
-            start=start_dt,
-            end=end_dt,
-            antig_sel=fs.antig,
-            edad_sel=fs.edad,
-        )
-
-        df_daily = df_sal_daily.merge(df_exist_daily[["Día", "Existencias"]], on="Día", how="left")
-        df_daily["Existencias"] = df_daily["Existencias"].fillna(0).astype(int)
-        df_daily = add_calendar_fields(df_daily, "Día")
-
-        df_period = aggregate_daily_to_period_simple(df_daily, period)
-
-    # 3) KPI DS30-STD + MA3 + Meta + flags
-    with st.spinner("Calculando KPI robusto (Deserción 30D estandarizada) + meta..."):
-        last_year = int(end_dt.year) - 1
-        base_start = pd.Timestamp(date(last_year, 1, 1))
-        base_end = pd.Timestamp(date(last_year, 12, 31))
-
-        if pd.notna(min_date):
-            base_start = max(base_start, pd.Timestamp(min_date).normalize())
-        if pd.notna(max_date):
-            base_end = min(base_end, pd.Timestamp(max_date).normalize())
-
-        weights = compute_standard_weights_from_baseline(
-            df_events_baseline=df0,
-            period=period,
-            ref_start=base_start,
-            ref_end=base_end,
-        )
-
-        kpi_period = compute_ds30_std_by_period(
-            df_events_filtered=df0_f,
-            start=start_dt,
-            end=end_dt,
-            period=period,
-            cut_today=cut_today,
-            weights=weights,
+    # 2) Pirámide D/W/M/Y para la selección actual (cambiar "Agrupar por" es un lookup).
+    #    Modo aproximado: misma ruta sobre una muestra de personas, expandida por 1/f con bandas de error;
+    #    "Calcular exacto" fija la ruta completa para la selección vigente.
+    sel_fp = selection_fingerprint(ix.fingerprint, fs)
+    approx = bool(opts.get("approx_mode")) and st.session_state.get("approx_exact_fp") != sel_fp
+    src_ix, src_fidx, src_fp = ix, fidx, sel_fp
+    if approx:
+        smp = build_approx_sample(df0, ix.fingerprint, APPROX_SAMPLE_FRAC)
+        src_ix, src_fidx = smp.ix, smp.fidx
+        src_fp = selection_fingerprint(smp.ix.fingerprint, fs)
+
+    with st.spinner("Calculando existencias, salidas y KPI robusto (Deserción 30D estandarizada) + meta..."):
+        pyr = get_period_pyramid(
+            src_ix,
+            src_fidx,
+            fs,
+            src_fp,
+            start_dt,
+            end_dt,
+            cut_today,
             H_days=H_DAYS,
             min_base=MIN_BASE_KPI,
         )
+        if approx:
+            pyr = scale_pyramid(pyr, smp.frac, MIN_BASE_KPI)
+        df_daily = pyr.daily
+        df_sal_det = pyr.sal_det
+        df_period = pyr.periods[period]
 
-        kpi_period = kpi_period.sort_values("cut").reset_index(drop=True)
-        kpi_period["MA3"] = kpi_period["DS30_std"].rolling(window=3, min_periods=1).mean()
+    # 3) KPI DS30-STD + MA3 + Meta + flags (sobre el periodo elegido)
+    weights = pyr.weights[period]
+    kpi_period = pyr.kpi[period]
 
-        kpi_base = compute_ds30_std_by_period(
-            df_events_filtered=df0,
-            start=base_start,
-            end=base_end,
-            period=period,
-            cut_today=cut_today,
-            weights=weights,
-            H_days=H_DAYS,
-            min_base=MIN_BASE_KPI,
-        )
-        meta_val = meta_from_last_year_last3(kpi_base, end_dt=end_dt, value_col="DS30_std")
-        kpi_period["Meta"] = meta_val
+    kpi_period = kpi_period.sort_values("cut").reset_index(drop=True)
+    kpi_period["MA3"] = kpi_period["DS30_std"].rolling(window=3, min_periods=1).mean()
 
-        kpi_period["flag_text"] = ""
-        kpi_period.loc[kpi_period["flag_incomplete_30d"] == True, "flag_text"] = "INCOMPLETO 30D"
-        kpi_period.loc[(kpi_period["flag_text"] == "") & (kpi_period["flag_base_baja"] == True), "flag_text"] = f"BASE BAJA (<{MIN_BASE_KPI})"
-        kpi_period.loc[(kpi_period["flag_text"] == "") & (kpi_period["coverage_w"] < MIN_COVERAGE_W), "flag_text"] = f"COBERTURA < {int(MIN_COVERAGE_W*100)}%"
+    meta_val = pyr.meta[period]
+    kpi_period["Meta"] = meta_val
+
+    kpi_period["flag_text"] = ""
+    kpi_period.loc[kpi_period["flag_incomplete_30d"] == True, "flag_text"] = "INCOMPLETO 30D"
+    kpi_period.loc[(kpi_period["flag_text"] == "") & (kpi_period["flag_base_baja"] == True), "flag_text"] = f"BASE BAJA (<{MIN_BASE_KPI})"
+    kpi_period.loc[(kpi_period["flag_text"] == "") & (kpi_period["coverage_w"] < MIN_COVERAGE_W), "flag_text"] = f"COBERTURA < {int(MIN_COVERAGE_W*100)}%"
 
     # =============================================================================
     # VIEW: DASHBOARD
     # =============================================================================
     st.subheader("Dashboard")
+    if approx:
+        c_msg, c_btn = st.columns([4, 1], gap="large")
+        c_msg.info(MSG_APPROX_ON.format(
+            pct=f"{smp.frac*100:.1f}%".replace(".", ","), n=fmt_int_es(smp.n_sampled), N=fmt_int_es(smp.n_persons),
+        ))
+        if c_btn.button(BTN_APPROX_EXACT, key="btn_approx_exact", use_container_width=True):
+            st.session_state["approx_exact_fp"] = sel_fp
+            st.rerun()
+    elif opts.get("approx_mode"):
+        st.caption(MSG_APPROX_EXACT)
+    est = "≈ " if approx else ""
 
     total_salidas = float(df_period["Salidas"].sum()) if not df_period.empty else 0.0
     exist_prom_rango = float(np.nanmean(df_period["Existencias_Prom"].values)) if not df_period.empty else np.nan
@@ -132,8 +110,8 @@ def render_dashboard(*, g: dict, fs, opts: dict) -> None:
     last_surv30 = (1.0 - last_ds30) if pd.notna(last_ds30) else np.nan
 
     k1, k2, k3 = st.columns(3, gap="large")
-    k1.metric("Salidas (total en rango)", fmt_int_es(total_salidas))
-    k2.metric("Existencias promedio (rango)", fmt_es(exist_prom_rango, 1))
+    k1.metric("Salidas (total en rango)", est + fmt_int_es(total_salidas))
+    k2.metric("Existencias promedio (rango)", est + fmt_es(exist_prom_rango, 1))
     k3.metric(
         "Supervivencia 30D (último periodo, std)",
         "-" if np.isnan(last_surv30) else f"{last_surv30*100:.1f}%".replace(".", ","),
@@ -146,6 +124,14 @@ def render_dashboard(*, g: dict, fs, opts: dict) -> None:
         fig = fig_kpi_ds30(kpi_period, meta_val=meta_val, show_labels=show_labels, min_base_kpi=MIN_BASE_KPI)
         st.plotly_chart(fig, use_container_width=True)
 
+    st.markdown("### Deserción por horizonte (" + " / ".join(f"DS{h}" for h in KPI_HORIZONS_DAYS) + ")")
+    kpi_h = pyr.kpi_horizons[period]
+    if kpi_h.empty or kpi_h[[f"DS{h}_std" for h in KPI_HORIZONS_DAYS]].dropna(how="all").empty:
+        st.info(MSG_NO_DATA_FOR_VIEW)
+    else:
+        st.caption("Cada horizonte H exige follow-up completo (cut + H <= hoy); los cortes más recientes quedan vacíos en los horizontes largos.")
+        st.plotly_chart(fig_ds_horizons(kpi_h, KPI_HORIZONS_DAYS, show_labels=show_labels), use_container_width=True)
+
     st.markdown("### Existencias & Salidas (por periodo)")
     if df_period.empty:
         st.info(MSG_NO_DATA_FOR_VIEW)
@@ -153,5 +139,60 @@ def render_dashboard(*, g: dict, fs, opts: dict) -> None:
         fig2 = fig_exist_salidas(df_period, period_label=period_label, show_labels=show_labels)
         st.plotly_chart(fig2, use_container_width=True)
 
+    st.markdown("### Flujos: Ingresos, Salidas y flujo neto (por periodo)")
+    st.caption("Ingresos = inicio de intervalo (ingreso o reingreso); Salidas = término real del intervalo. "
+               "Existencias al cierre = cierre anterior + ingresos − salidas + otros movimientos "
+               "(cambios de tramo si filtras edad/antigüedad).")
+    if df_period.empty:
+        st.info(MSG_NO_DATA_FOR_VIEW)
+    else:
+        st.plotly_chart(fig_flujos(df_period, period_label=period_label, show_labels=show_labels), use_container_width=True)
+
+    st.markdown("### Desglose por dimensión (Existencias & Salidas)")
+    catalog = dict(opts["desc_vars_catalog"])
+    dim_label = st.selectbox(LBL_BREAKDOWN_DIM, [LBL_BREAKDOWN_NONE] + list(catalog), key="dash_breakdown_dim")
+    if dim_label in catalog:
+        with st.spinner("Calculando desglose..."):
+            bx, bs = get_dim_breakdown(
+                src_ix, src_fidx, fs, src_fp, catalog[dim_label], start_dt, end_dt, cut_today
+            )
+            if approx:
+                bx = scale_counts(bx, list(bx.columns[1:]), smp.frac)
+                bs = scale_counts(bs, list(bs.columns[1:]), smp.frac)
+        cats = list(bx.columns[1:])
+        if not cats:
+            st.info(MSG_NO_DATA_FOR_VIEW)
+        else:
+            # top-N por existencias promedio del rango; el resto se agrupa en OTROS
+            keep = list(bx[cats].mean().sort_values(ascending=False).index[:topn])
+            bx = collapse_columns_otros(bx, cats, keep)
+            bs = collapse_columns_otros(bs, cats, keep)
+            shown = list(bx.columns[1:])
+
+            ex_p = aggregate_daily_to_period(add_calendar_fields(bx, "Día"), period, mean_cols=tuple(shown))
+            ex_p = ex_p.rename(columns={f"{c}_Prom": c for c in shown})
+            sal_p = aggregate_daily_to_period(add_calendar_fields(bs, "Día"), period, sum_cols=tuple(shown))
+
+            c1, c2 = st.columns(2, gap="large")
+            c1.plotly_chart(
+                fig_stacked_area(ex_p, shown, title=f"Existencias promedio por {dim_label} — {period_label}", y_title="Existencias (promedio)"),
+                use_container_width=True,
+            )
+            c2.plotly_chart(
+                fig_stacked_area(sal_p, shown, title=f"Salidas por {dim_label} — {period_label}", y_title="Salidas"),
+                use_container_width=True,
+            )
+
+    st.markdown("### Rotación móvil")
+    df_rolling = pyr.rolling
+    if df_rolling.empty or df_rolling[[f"Rotacion_{w}D" for w in ROLLING_WINDOWS_DAYS]].dropna(how="all").empty:
+        st.info(MSG_NO_DATA_FOR_VIEW)
+    else:
+        fig3 = fig_rolling_turnover(df_rolling, ROLLING_WINDOWS_DAYS, show_labels=show_labels)
+        st.plotly_chart(fig3, use_container_width=True)
+
     from rrhh_panel.ui.downloads import downloads_panel
-    downloads_panel(df_daily=df_daily, df_period=df_period, kpi_period=kpi_period, df_sal_det=df_sal_det, weights=weights)
+    downloads_panel(
+        df_daily=df_daily, df_period=df_period, kpi_period=kpi_period, df_sal_det=df_sal_det, weights=weights,
+        df_rolling=df_rolling, kpi_horizons=kpi_h,
+    )
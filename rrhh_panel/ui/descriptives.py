@@ -6,20 +6,62 @@ import numpy as np
 import pandas as pd
 import streamlit as st
 
-from rrhh_panel.filters.apply import apply_categorical_filters
-from rrhh_panel.features.buckets import bucket_antiguedad, bucket_edad_from_dob
+from rrhh_panel.features.buckets import AGE_BUCKETS, TENURE_BUCKETS, bucket_categories
+from rrhh_panel.preprocessing.active_set import build_active_set_index
+from rrhh_panel.preprocessing.lexis import build_lexis_table
 from rrhh_panel.descriptives.topn import counts_topn_with_otros
 from rrhh_panel.descriptives.shares import compute_exit_share_of_total_existences
+from rrhh_panel.descriptives.cohorts import get_retention_matrix
 from rrhh_panel.viz.charts import bar_and_pie
-from rrhh_panel.viz.descriptives_figs import fig_exit_share
+from rrhh_panel.viz.descriptives_figs import fig_exit_share, fig_retention_heatmap
 from rrhh_panel.utils.formatting import fmt_int_es, fmt_es
+from rrhh_panel.utils.fingerprint import selection_fingerprint
+from rrhh_panel.utils.safe import safe_table_for_streamlit
+from rrhh_panel.config.params import COHORT_MONTHS_OPTIONS, DEFAULT_COHORT_MONTHS
 from rrhh_panel.config.texts import (
     MSG_NO_DATA_FOR_VIEW,
     LBL_OPT_DESC_DATASET, LBL_OPT_DESC_DATASET_1, LBL_OPT_DESC_DATASET_2,
+    LBL_DESC_TAB_MAIN, LBL_DESC_TAB_COHORTS, LBL_COHORT_MONTHS,
 )
 from rrhh_panel.time_windows.aggregate import aggregate_daily_to_period_simple
 
 def render_descriptives(*, g: dict, fs, opts: dict) -> None:
+    if g["fidx"].count(fs) == 0:
+        st.warning(MSG_NO_DATA_FOR_VIEW)
+        st.stop()
+
+    tab_d, tab_c = st.tabs([LBL_DESC_TAB_MAIN, LBL_DESC_TAB_COHORTS])
+    # la pestaña de cohortes va primero en el script: la principal puede cortar con st.stop()
+    with tab_c:
+        _render_cohorts(g=g, fs=fs, opts=opts)
+    with tab_d:
+        _render_existencias_salidas(g=g, fs=fs, opts=opts)
+
+def _render_cohorts(*, g: dict, fs, opts: dict) -> None:
+    end_dt = g["end_dt"]
+    n_months = st.selectbox(
+        LBL_COHORT_MONTHS, list(COHORT_MONTHS_OPTIONS),
+        index=list(COHORT_MONTHS_OPTIONS).index(DEFAULT_COHORT_MONTHS), key="desc_cohort_months",
+    )
+    last_month = pd.Timestamp(end_dt).to_period("M").to_timestamp()
+    first_month = (pd.Timestamp(end_dt).to_period("M") - (int(n_months) - 1)).to_timestamp()
+
+    sel_fp = selection_fingerprint(g["ix"].fingerprint, fs)
+    df_ret, df_act = get_retention_matrix(g["ix"], g["fidx"], fs, sel_fp, first_month, last_month, g["cut_today"], int(n_months))
+
+    st.subheader("Retención por cohorte de ingreso")
+    if df_ret.empty or int(df_ret["Ingresos"].sum()) == 0:
+        st.info(MSG_NO_DATA_FOR_VIEW)
+        return
+    st.caption(
+        "Cohorte = mes de ingreso (o reingreso) del intervalo; M = meses cumplidos desde el ingreso. "
+        "Celdas vacías: aún sin follow-up completo al corte. El filtro de edad se aplica a la edad al ingreso."
+    )
+    st.plotly_chart(fig_retention_heatmap(df_ret, df_act, show_labels=bool(opts["show_labels"])), use_container_width=True)
+    with st.expander("Ver tabla (activos por cohorte y mes)", expanded=False):
+        st.dataframe(safe_table_for_streamlit(df_act), use_container_width=True, height=320)
+
+def _render_existencias_salidas(*, g: dict, fs, opts: dict) -> None:
     df0 = g["df0"]
     start_dt = g["start_dt"]
     end_dt = g["end_dt"]
@@ -33,19 +75,30 @@ def render_descriptives(*, g: dict, fs, opts: dict) -> None:
     exit_share_var = str(opts.get("exit_share_var", "Área General"))
     exit_share_col = desc_vars_catalog.get(exit_share_var, "area_gen")
 
-    df0_f = apply_categorical_filters(df0, fs)
-    if df0_f.empty:
-        st.warning(MSG_NO_DATA_FOR_VIEW)
-        st.stop()
+    fidx = g["fidx"]
+    mask_f = fidx.mask(fs)
+    df0_f = df0[mask_f]
 
-    # ---- Dataset Existencias (snapshot) con buckets
-    df_now = df0_f[(df0_f["ini"] <= snap_dt) & (df0_f["fin_eff"] >= snap_dt)].copy()
+    # ---- Dataset Existencias (snapshot) con buckets: índice de activos por fecha + último episodio por persona
+    ix = g["ix"]
+    aidx = build_active_set_index(df0, ix.fingerprint)
+    rows = aidx.latest_per_person(aidx.active_rows(snap_dt), mask=mask_f)
+    df_now = df0.iloc[rows].copy()
     if not df_now.empty:
-        df_now = df_now.sort_values(["cod", "ini"]).groupby("cod", as_index=False).tail(1).copy()
+        # buckets del tramo Lexis que contiene el snapshot en el intervalo fusionado del episodio
+        # (antigüedad desde el ini del intervalo, igual que existencias y KPI)
+        lx = build_lexis_table(ix, ix.fingerprint)
+        pos = ix.event_interval[rows]
+        snap_day = int(np.datetime64(pd.Timestamp(snap_dt).normalize(), "D").astype("int64"))
+        seg = lx.locate(pos, np.full(len(pos), snap_day))
         df_now["ref"] = snap_dt
-        df_now["antig_dias"] = (df_now["ref"] - df_now["ini"]).dt.days
-        df_now["Antigüedad"] = bucket_antiguedad(df_now["antig_dias"])
-        df_now["Edad"] = bucket_edad_from_dob(df_now["fnac"], df_now["ref"])
+        df_now["antig_dias"] = (snap_dt - ix.intervals["ini"].iloc[pos]).dt.days.to_numpy()
+        df_now["Antigüedad"] = pd.Categorical.from_codes(
+            np.where(seg >= 0, lx.antig[seg], len(TENURE_BUCKETS)), dtype=bucket_categories(TENURE_BUCKETS)
+        )
+        df_now["Edad"] = pd.Categorical.from_codes(
+            np.where(seg >= 0, lx.edad[seg], len(AGE_BUCKETS)), dtype=bucket_categories(AGE_BUCKETS)
+        )
         if fs.antig:
             df_now = df_now[df_now["Antigüedad"].isin(fs.antig)]
         if fs.edad:
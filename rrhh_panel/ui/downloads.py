@@ -7,7 +7,7 @@ import streamlit as st
 
 from rrhh_panel.utils.safe import safe_table_for_streamlit
 
-def downloads_panel(*, df_daily, df_period, kpi_period, df_sal_det, weights) -> None:
+def downloads_panel(*, df_daily, df_period, kpi_period, df_sal_det, weights, df_rolling=None, kpi_horizons=None) -> None:
     with st.expander("Descargar (Excel) / Ver datos base", expanded=False):
         buf = io.BytesIO()
         with pd.ExcelWriter(buf, engine="openpyxl") as writer:
@@ -16,9 +16,13 @@ def downloads_panel(*, df_daily, df_period, kpi_period, df_sal_det, weights) ->
             kpi_period.to_excel(writer, index=False, sheet_name="KPI_DS30_STD")
             df_sal_det.to_excel(writer, index=False, sheet_name="Salidas_Detalle")
             weights.to_excel(writer, index=False, sheet_name="Pesos_Estrato")
+            if df_rolling is not None:
+                df_rolling.to_excel(writer, index=False, sheet_name="Rotacion_Movil")
+            if kpi_horizons is not None:
+                kpi_horizons.to_excel(writer, index=False, sheet_name="KPI_Horizontes")
 
         st.download_button(
-            "Descargar Excel (Diario + Periodo + KPI + Salidas Detalle + Pesos)",
+            "Descargar Excel (Diario + Periodo + KPI + Salidas Detalle + Pesos + Rotación móvil + Horizontes)",
             data=buf.getvalue(),
             file_name="rrhh_panel_limpio.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
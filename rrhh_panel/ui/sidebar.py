@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import os
 from datetime import date
+from typing import List
 import pandas as pd
 import streamlit as st
 
@@ -13,15 +14,20 @@ from rrhh_panel.config.texts import (
     LBL_FILTERS_HINT, BTN_CLEAR_FILTERS,
     LBL_SEXO, LBL_AREA_GEN, LBL_AREA, LBL_CARGO, LBL_CLAS, LBL_TS, LBL_EMP, LBL_NAC, LBL_LUG, LBL_REG,
     LBL_TENURE_BUCKET, LBL_AGE_BUCKET,
-    LBL_OPT_UNIQUE_DAY, LBL_OPT_SHOW_LABELS, LBL_OPT_TOPN,
+    LBL_OPT_SHOW_LABELS, LBL_OPT_TOPN, LBL_OPT_APPROX,
     LBL_OPT_DESC_VARS, LBL_OPT_EXIT_SHARE_VAR,
     MSG_LOAD_FILE_TO_START, MSG_PATH_NOT_FOUND, MSG_READ_FAIL,
 )
 from rrhh_panel.config.params import DEFAULT_TOPN, DEFAULT_RANGE_DAYS
-from rrhh_panel.data_io.readers import read_csv_any, read_excel_strict_hist
-from rrhh_panel.preprocessing.historia_personal import validate_and_prepare_hist, merge_intervals_per_person
+from rrhh_panel.data_io.readers import read_csv_strict_hist, read_excel_strict_hist, list_excel_sheets
+from rrhh_panel.data_io.cache import (
+    CACHE_LOAD_ERRORS, content_hash, prepared_cache_key, has_prepared, load_prepared_index, save_prepared_index,
+)
+from rrhh_panel.preprocessing.historia_personal import validate_and_prepare_hist
+from rrhh_panel.preprocessing.intervals import build_interval_index
 from rrhh_panel.filters.state import FilterState
-from rrhh_panel.filters.options import options_for_col
+from rrhh_panel.filters.index import FILTER_COLS, build_filter_index
+from rrhh_panel.filters.options import facet_counts, facet_label
 from rrhh_panel.features.buckets import TENURE_BUCKETS, AGE_BUCKETS
 from rrhh_panel.utils.dates import today_dt
 
@@ -45,38 +51,58 @@ def render_sidebar() -> None:
 
         try:
             if uploaded is not None:
-                if uploaded.name.lower().endswith(".csv"):
-                    df_raw = read_csv_any(uploaded)
-                else:
-                    xls = pd.ExcelFile(uploaded)
-                    sheet_hist = st.selectbox(LBL_SHEET_MAIN, options=xls.sheet_names, index=0, key="sheet_hist_upload")
-                    df_raw = read_excel_strict_hist(uploaded, sheet_hist)
+                src = uploaded
+                is_csv = uploaded.name.lower().endswith(".csv")
+                if not is_csv:
+                    sheet_hist = st.selectbox(LBL_SHEET_MAIN, options=list_excel_sheets(uploaded), index=0, key="sheet_hist_upload")
             else:
-                p = path.strip()
-                if not os.path.exists(p):
+                src = path.strip()
+                if not os.path.exists(src):
                     st.error(MSG_PATH_NOT_FOUND)
                     st.stop()
-                if p.lower().endswith(".csv"):
-                    df_raw = read_csv_any(p)
-                else:
-                    xls = pd.ExcelFile(p)
-                    sheet_hist = st.selectbox(LBL_SHEET_MAIN, options=xls.sheet_names, index=0, key="sheet_hist_path")
-                    df_raw = read_excel_strict_hist(p, sheet_hist)
+                is_csv = src.lower().endswith(".csv")
+                if not is_csv:
+                    sheet_hist = st.selectbox(LBL_SHEET_MAIN, options=list_excel_sheets(src), index=0, key="sheet_hist_path")
 
-        except Exception as e:
-            st.error(f"{MSG_READ_FAIL} {e}")
-            st.stop()
+            # caché en disco por contenido + hoja: si existe, no se vuelve a leer ni preparar
+            cache_key = prepared_cache_key(content_hash(src), sheet_hist)
 
-        try:
-            df0 = validate_and_prepare_hist(df_raw)
         except Exception as e:
-            st.error(str(e))
+            st.error(f"{MSG_READ_FAIL} {e}")
             st.stop()
 
-        df_intervals_all = merge_intervals_per_person(df0)
-
-        min_date = df_intervals_all["ini"].min()
-        max_date = df_intervals_all["fin_eff"].max()
+        ix = None
+        if has_prepared(cache_key):
+            try:
+                ix = load_prepared_index(cache_key, str(today_dt().date()))
+            except CACHE_LOAD_ERRORS:
+                ix = None  # entrada ilegible: se vuelve a leer, preparar y guardar
+
+        if ix is None:
+            try:
+                df_raw = read_csv_strict_hist(src) if is_csv else read_excel_strict_hist(src, sheet_hist)
+            except Exception as e:
+                st.error(f"{MSG_READ_FAIL} {e}")
+                st.stop()
+
+            try:
+                df0 = validate_and_prepare_hist(df_raw)
+            except Exception as e:
+                st.error(str(e))
+                st.stop()
+
+            ix = build_interval_index(df0)
+            try:
+                save_prepared_index(cache_key, ix, overwrite=True)
+            except OSError:
+                pass  # sin caché en disco (p.ej. FS de solo lectura): seguimos en memoria
+
+        df0 = ix.events
+        df_intervals_all = ix.intervals
+        fidx = build_filter_index(df0, ix.fingerprint)
+
+        min_date = ix.min_date
+        max_date = ix.max_date
         default_end = min(today_dt(), max_date) if pd.notna(max_date) else today_dt()
         default_start = max(min_date, default_end - pd.Timedelta(days=DEFAULT_RANGE_DAYS)) if pd.notna(min_date) else (default_end - pd.Timedelta(days=DEFAULT_RANGE_DAYS))
 
@@ -142,6 +168,8 @@ def render_sidebar() -> None:
 
         st.session_state["__globals__"] = {
             "df0": df0,
+            "ix": ix,
+            "fidx": fidx,
             "df_intervals_all": df_intervals_all,
             "start_dt": start_dt,
             "end_dt": end_dt,
@@ -160,7 +188,8 @@ def render_sidebar() -> None:
         g = st.session_state.get("__globals__")
         if not g:
             st.stop()
-        df0 = g["df0"]
+        fidx = g["fidx"]
+        fidx_fingerprint = g["ix"].fingerprint
 
         st.caption(LBL_FILTERS_HINT)
 
@@ -172,25 +201,34 @@ def render_sidebar() -> None:
                 st.session_state[k] = []
             st.rerun()
 
-        area_gen_pick = st.multiselect(LBL_AREA_GEN, options_for_col(df0, "area_gen"), default=st.session_state.get("f_area_gen", []), key="f_area_gen")
-
-        if area_gen_pick:
-            df_area = df0[df0["area_gen"].isin(area_gen_pick)]
-            area_opts = options_for_col(df_area, "area")
-        else:
-            area_opts = options_for_col(df0, "area")
+        # facetas: opciones con conteo de eventos bajo el resto de filtros activos (selección vigente)
+        selected = tuple((c, tuple(st.session_state.get(f"f_{c}", []))) for c in FILTER_COLS)
+        facets = facet_counts(fidx, fidx_fingerprint, selected)
+
+        def _facet_select(label: str, col: str) -> List[str]:
+            counts = facets.get(col, {})
+            opts = list(counts)
+            # lo ya elegido se mantiene como opción aunque el padre lo excluya
+            opts += [v for v in st.session_state.get(f"f_{col}", []) if v not in counts]
+            return st.multiselect(
+                label,
+                opts,
+                default=st.session_state.get(f"f_{col}", []),
+                key=f"f_{col}",
+                format_func=facet_label(counts),
+            )
 
         fs = FilterState(
-            sexo=st.multiselect(LBL_SEXO, options_for_col(df0, "sexo"), default=st.session_state.get("f_sexo", []), key="f_sexo"),
-            area_gen=area_gen_pick,
-            area=st.multiselect(LBL_AREA, area_opts, default=st.session_state.get("f_area", []), key="f_area"),
-            cargo=st.multiselect(LBL_CARGO, options_for_col(df0, "cargo"), default=st.session_state.get("f_cargo", []), key="f_cargo"),
-            clas=st.multiselect(LBL_CLAS, options_for_col(df0, "clas"), default=st.session_state.get("f_clas", []), key="f_clas"),
-            ts=st.multiselect(LBL_TS, options_for_col(df0, "ts"), default=st.session_state.get("f_ts", []), key="f_ts"),
-            emp=st.multiselect(LBL_EMP, options_for_col(df0, "emp"), default=st.session_state.get("f_emp", []), key="f_emp"),
-            nac=st.multiselect(LBL_NAC, options_for_col(df0, "nac"), default=st.session_state.get("f_nac", []), key="f_nac"),
-            lug=st.multiselect(LBL_LUG, options_for_col(df0, "lug"), default=st.session_state.get("f_lug", []), key="f_lug"),
-            reg=st.multiselect(LBL_REG, options_for_col(df0, "reg"), default=st.session_state.get("f_reg", []), key="f_reg"),
+            area_gen=_facet_select(LBL_AREA_GEN, "area_gen"),
+            sexo=_facet_select(LBL_SEXO, "sexo"),
+            area=_facet_select(LBL_AREA, "area"),
+            cargo=_facet_select(LBL_CARGO, "cargo"),
+            clas=_facet_select(LBL_CLAS, "clas"),
+            ts=_facet_select(LBL_TS, "ts"),
+            emp=_facet_select(LBL_EMP, "emp"),
+            nac=_facet_select(LBL_NAC, "nac"),
+            lug=_facet_select(LBL_LUG, "lug"),
+            reg=_facet_select(LBL_REG, "reg"),
             antig=st.multiselect(
                 LBL_TENURE_BUCKET,
                 list(TENURE_BUCKETS.keys()) + ["SIN DATO"],
@@ -210,9 +248,9 @@ def render_sidebar() -> None:
     # TAB: Opciones
     # -------------------------
     with tab_o:
-        unique_personas_por_dia = st.checkbox(LBL_OPT_UNIQUE_DAY, value=True, key="opt_unique_day")
         show_labels = st.checkbox(LBL_OPT_SHOW_LABELS, value=True, key="opt_show_labels")
         topn = int(st.number_input(LBL_OPT_TOPN, min_value=5, max_value=30, value=DEFAULT_TOPN, step=1, key="opt_topn"))
+        approx_mode = st.checkbox(LBL_OPT_APPROX, value=False, key="opt_approx")
 
         desc_vars_catalog = {
             "Área General": "area_gen",
@@ -245,10 +283,10 @@ def render_sidebar() -> None:
         )
 
         st.session_state["__opts__"] = {
-            "unique_personas_por_dia": unique_personas_por_dia,
             "show_labels": show_labels,
             "topn": topn,
             "desc_vars": desc_vars,
             "desc_vars_catalog": desc_vars_catalog,
             "exit_share_var": exit_share_var,
+            "approx_mode": approx_mode,
         }
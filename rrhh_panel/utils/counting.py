@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+def distinct_count_by(group: np.ndarray, ids: np.ndarray, n_groups: int) -> np.ndarray:
+    # n° de ids distintos por grupo (ambos enteros densos >= 0), sin ordenar:
+    # clave combinada grupo*span + id, únicos por hash y bincount por grupo
+    group = np.asarray(group, dtype=np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids) == 0:
+        return np.zeros(int(n_groups), dtype=np.int64)
+    span = int(ids.max()) + 1
+    uniq = pd.unique(group * span + ids)
+    return np.bincount(uniq // span, minlength=int(n_groups))
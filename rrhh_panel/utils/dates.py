@@ -2,7 +2,10 @@
 from __future__ import annotations
 
 from datetime import date, timedelta
+from typing import Tuple
+import numpy as np
 import pandas as pd
+import streamlit as st
 
 def to_datetime_norm(s: pd.Series) -> pd.Series:
     return pd.to_datetime(s, errors="coerce").dt.normalize()
@@ -23,24 +26,49 @@ def week_end_sun_to_sat(d: pd.Series) -> pd.Series:
 def month_end(d: pd.Series) -> pd.Series:
     return (d + pd.offsets.MonthEnd(0)).dt.normalize()
 
-def add_calendar_fields(df: pd.DataFrame, date_col: str) -> pd.DataFrame:
-    out = df.copy()
-    d = pd.to_datetime(out[date_col], errors="coerce").dt.normalize()
+# =============================================================================
+# Tabla calendario (una fila por día, años completos) + lookup por offset
+# =============================================================================
+CALENDAR_COLS = ["Día", "Año", "Mes", "Semana", "CodSem", "CodMes", "FinSemana", "FinMes"]
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def calendar_table(first_year: int, last_year: int) -> pd.DataFrame:
+    # compartida entre llamadas (solo lectura): columnas públicas (CALENDAR_COLS)
+    # + códigos enteros de periodo (sem_id = YYWW, mes_id = YYMM)
+    d = pd.Series(pd.date_range(date(int(first_year), 1, 1), date(int(last_year), 12, 31), freq="D"))
+
+    cal = pd.DataFrame({"Día": d})
+    cal["Año"] = d.dt.year.astype("int64")
+    cal["Mes"] = d.dt.month.astype("int64")
+    cal["Semana"] = excel_weeknum_return_type_1(d).astype("int64")
+    cal["sem_id"] = (cal["Año"] % 100) * 100 + cal["Semana"]
+    cal["mes_id"] = (cal["Año"] % 100) * 100 + cal["Mes"]
 
-    out["Día"] = d
-    out["Año"] = d.dt.year.astype("int64")
-    out["Mes"] = d.dt.month.astype("int64")
-    out["Semana"] = excel_weeknum_return_type_1(d).astype("int64")
+    # etiquetas YYWW / YYMM: se formatean una vez por periodo, no por fila
+    sem_u, sem_inv = np.unique(cal["sem_id"].to_numpy(), return_inverse=True)
+    mes_u, mes_inv = np.unique(cal["mes_id"].to_numpy(), return_inverse=True)
+    cal["CodSem"] = np.array([f"{c:04d}" for c in sem_u], dtype=object)[sem_inv]
+    cal["CodMes"] = np.array([f"{c:04d}" for c in mes_u], dtype=object)[mes_inv]
 
-    yy = (out["Año"] % 100).astype(int).astype(str).str.zfill(2)
-    ww = out["Semana"].astype(int).astype(str).str.zfill(2)
-    mm = out["Mes"].astype(int).astype(str).str.zfill(2)
+    cal["FinSemana"] = week_end_sun_to_sat(d)
+    cal["FinMes"] = month_end(d)
+    return cal
 
-    out["CodSem"] = (yy + ww).astype(str)  # YYWW
-    out["CodMes"] = (yy + mm).astype(str)  # YYMM
+def calendar_for(days: pd.Series) -> Tuple[pd.DataFrame, np.ndarray]:
+    # tabla que cubre los años de days + posición de cada día en ella
+    d = pd.to_datetime(days, errors="coerce").dt.normalize().values.astype("datetime64[D]")
+    if len(d) == 0:
+        return calendar_table(1970, 1970), np.zeros(0, dtype=np.int64)
+    y = d.astype("datetime64[Y]").astype("int64") + 1970
+    cal = calendar_table(int(y.min()), int(y.max()))
+    origin = np.datetime64(f"{int(y.min())}-01-01", "D")
+    return cal, (d - origin).astype("int64")
 
-    out["FinSemana"] = week_end_sun_to_sat(d)
-    out["FinMes"] = month_end(d)
+def add_calendar_fields(df: pd.DataFrame, date_col: str) -> pd.DataFrame:
+    out = df.copy()
+    cal, off = calendar_for(out[date_col])
+    for c in CALENDAR_COLS:
+        out[c] = cal[c].to_numpy()[off]
     return out
 
 def years_offset_date(d: date, years: int) -> date:
@@ -49,5 +77,18 @@ def years_offset_date(d: date, years: int) -> date:
     except ValueError:
         return d.replace(month=2, day=28, year=d.year + years)
 
+def years_offset_days(d: np.ndarray, years: int, feb29_to_mar1: bool = False) -> np.ndarray:
+    # versión vectorizada de years_offset_date sobre datetime64[D] (29-feb -> 28-feb).
+    # feb29_to_mar1: cumpleaños "calendario" (29-feb cumple el 1-mar en años no bisiestos),
+    # que es lo que usa bucket_edad_from_dob.
+    d = np.asarray(d, dtype="datetime64[D]")
+    m = d.astype("datetime64[M]")
+    day = (d - m).astype("int64")
+    y = m.astype("datetime64[Y]").astype("int64") + 1970 + int(years)
+    mon = (m - m.astype("datetime64[Y]")).astype("int64")
+    leap = ((y % 4 == 0) & (y % 100 != 0)) | (y % 400 == 0)
+    day = np.where((mon == 1) & (day == 28) & ~leap, 28 if feb29_to_mar1 else 27, day)
+    return ((y - 1970) * 12 + mon).astype("datetime64[M]").astype("datetime64[D]") + day
+
 def date_range_days(start: pd.Timestamp, end: pd.Timestamp) -> pd.DatetimeIndex:
     return pd.date_range(start, end, freq="D")
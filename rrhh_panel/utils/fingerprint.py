@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import hashlib
+from dataclasses import asdict
+import pandas as pd
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    # huella estable del contenido (valores + columnas), para claves de caché por dataset
+    h = hashlib.sha1()
+    h.update("|".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+def selection_fingerprint(dataset_fingerprint: str, selection) -> str:
+    # huella de (dataset, selección de filtros); selection es un dataclass de listas (FilterState)
+    h = hashlib.sha1(dataset_fingerprint.encode("utf-8"))
+    for k, v in sorted(asdict(selection).items()):
+        h.update(f"{k}={sorted(map(str, v or []))};".encode("utf-8"))
+    return h.hexdigest()
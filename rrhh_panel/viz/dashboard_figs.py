@@ -8,6 +8,12 @@ from plotly.subplots import make_subplots
 from rrhh_panel.viz.labels import nice_xaxis, apply_line_labels
 from rrhh_panel.utils.formatting import fmt_es
 
+def _error_bars(df, col: str) -> dict | None:
+    # bandas de error (modo aproximado): columna {col}_err = semiancho del IC
+    if f"{col}_err" not in df.columns:
+        return None
+    return dict(type="data", array=df[f"{col}_err"].astype(float), visible=True, thickness=1)
+
 def fig_kpi_ds30(kpi_period, meta_val: float | None, show_labels: bool, min_base_kpi: int) -> go.Figure:
     fig = go.Figure()
 
@@ -16,6 +22,7 @@ def fig_kpi_ds30(kpi_period, meta_val: float | None, show_labels: bool, min_base
         y=kpi_period["DS30_std"],
         mode="lines+markers",
         name="DS30-STD",
+        error_y=_error_bars(kpi_period, "DS30_std"),
         customdata=np.stack([
             kpi_period["N"].fillna(0).astype(float),
             kpi_period["E"].fillna(0).astype(float),
@@ -87,6 +94,7 @@ def fig_exist_salidas(df_period, period_label: str, show_labels: bool) -> go.Fig
             name="Salidas",
             text=(df_period["Salidas"].round(0).astype(int).astype(str) if show_labels else None),
             textposition=("outside" if show_labels else None),
+            error_y=_error_bars(df_period, "Salidas"),
         ),
         secondary_y=False,
     )
@@ -96,6 +104,7 @@ def fig_exist_salidas(df_period, period_label: str, show_labels: bool) -> go.Fig
             y=df_period["Existencias_Prom"].astype(float),
             mode="lines+markers",
             name="Existencias (promedio)",
+            error_y=_error_bars(df_period, "Existencias_Prom"),
             hovertemplate="<b>Periodo</b>: %{x}<br><b>Existencias prom</b>: %{y:.1f}<extra></extra>",
         ),
         secondary_y=True,
@@ -110,3 +119,137 @@ def fig_exist_salidas(df_period, period_label: str, show_labels: bool) -> go.Fig
     fig2 = nice_xaxis(fig2)
     fig2 = apply_line_labels(fig2, show_labels)
     return fig2
+
+def fig_rolling_turnover(df_rolling, windows_days, show_labels: bool) -> go.Figure:
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    x = df_rolling["Día"]
+    for w in windows_days:
+        fig.add_trace(
+            go.Scatter(
+                x=x,
+                y=df_rolling[f"Rotacion_{w}D"],
+                mode="lines",
+                name=f"Rotación {w}D",
+                customdata=np.stack([
+                    df_rolling[f"Salidas_{w}D"].astype(float),
+                    df_rolling[f"Existencias_Prom_{w}D"].astype(float),
+                ], axis=1),
+                hovertemplate=(
+                    "<b>Día</b>: %{x|%Y-%m-%d}<br>"
+                    f"<b>Rotación {w}D</b>: %{{y:.1%}}<br>"
+                    f"<b>Salidas {w}D</b>: %{{customdata[0]:.0f}}<br>"
+                    "<b>Existencias prom</b>: %{customdata[1]:.1f}<extra></extra>"
+                ),
+            ),
+            secondary_y=False,
+        )
+    w_min = min(windows_days)
+    fig.add_trace(
+        go.Bar(
+            x=x,
+            y=df_rolling[f"Salidas_{w_min}D"],
+            name=f"Salidas {w_min}D",
+            opacity=0.3,
+            hovertemplate=f"<b>Día</b>: %{{x|%Y-%m-%d}}<br><b>Salidas {w_min}D</b>: %{{y:.0f}}<extra></extra>",
+        ),
+        secondary_y=True,
+    )
+    fig.update_layout(
+        title="Rotación móvil (salidas de la ventana / existencias promedio de la ventana)",
+        legend=dict(orientation="h"),
+        margin=dict(b=80),
+    )
+    fig.update_yaxes(title_text="Rotación", tickformat=".0%", secondary_y=False)
+    fig.update_yaxes(title_text="Salidas (ventana)", secondary_y=True)
+    fig = apply_line_labels(fig, show_labels)
+    return fig
+
+def fig_flujos(df_period, period_label: str, show_labels: bool) -> go.Figure:
+    x = df_period["Periodo"].astype(str)
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=x,
+        y=df_period["Ingresos"].astype(float),
+        name="Ingresos",
+        text=(df_period["Ingresos"].round(0).astype(int).astype(str) if show_labels else None),
+        textposition=("outside" if show_labels else None),
+    ))
+    fig.add_trace(go.Bar(
+        x=x,
+        y=-df_period["Salidas"].astype(float),
+        name="Salidas",
+        customdata=df_period["Salidas"].astype(float),
+        text=(df_period["Salidas"].round(0).astype(int).astype(str) if show_labels else None),
+        textposition=("outside" if show_labels else None),
+        hovertemplate="<b>Periodo</b>: %{x}<br><b>Salidas</b>: %{customdata:.0f}<extra></extra>",
+    ))
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=df_period["Flujo_Neto"].astype(float),
+        mode="lines+markers",
+        name="Flujo neto",
+        hovertemplate="<b>Periodo</b>: %{x}<br><b>Flujo neto</b>: %{y:.0f}<extra></extra>",
+    ))
+    fig.update_layout(
+        title=f"Ingresos (+), Salidas (−) y flujo neto — Agrupado por {period_label}",
+        barmode="relative",
+        legend=dict(orientation="h"),
+        margin=dict(b=80),
+    )
+    fig = nice_xaxis(fig)
+    fig = apply_line_labels(fig, show_labels)
+    return fig
+
+def fig_stacked_area(df_period, cats, title: str, y_title: str) -> go.Figure:
+    fig = go.Figure()
+    x = df_period["Periodo"].astype(str)
+    for c in cats:
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=df_period[c].astype(float),
+            mode="lines",
+            name=str(c),
+            stackgroup="one",
+            hovertemplate=f"<b>{c}</b><br><b>Periodo</b>: %{{x}}<br><b>{y_title}</b>: %{{y:.1f}}<extra></extra>",
+        ))
+    fig.update_layout(
+        title=title,
+        legend=dict(orientation="h"),
+        margin=dict(b=80),
+    )
+    fig.update_yaxes(title_text=y_title)
+    fig = nice_xaxis(fig)
+    return fig
+
+def fig_ds_horizons(kpi_horizons, horizons, show_labels: bool) -> go.Figure:
+    fig = go.Figure()
+    x = kpi_horizons["Periodo"].astype(str)
+    for h in horizons:
+        fig.add_trace(go.Scatter(
+            x=x,
+            y=kpi_horizons[f"DS{h}_std"],
+            mode="lines+markers",
+            name=f"DS{h}-STD",
+            error_y=_error_bars(kpi_horizons, f"DS{h}_std"),
+            customdata=np.stack([
+                kpi_horizons["N"].fillna(0).astype(float),
+                kpi_horizons[f"E{h}"].fillna(0).astype(float),
+                kpi_horizons[f"DS{h}_raw"].astype(float),
+            ], axis=1),
+            hovertemplate=(
+                "<b>Periodo</b>: %{x}<br>"
+                f"<b>DS{h}-STD</b>: %{{y:.2%}}<br>"
+                f"<b>DS{h}-RAW</b>: %{{customdata[2]:.2%}}<br>"
+                "<b>N activos (cut)</b>: %{customdata[0]:.0f}<br>"
+                f"<b>E salen <={h}d</b>: %{{customdata[1]:.0f}}<extra></extra>"
+            ),
+        ))
+    fig.update_yaxes(tickformat=".0%", rangemode="tozero")
+    fig.update_layout(
+        title="Deserción estandarizada por horizonte (misma curva de salidas desde el corte)",
+        legend=dict(orientation="h"),
+        margin=dict(b=80),
+    )
+    fig = nice_xaxis(fig)
+    fig = apply_line_labels(fig, show_labels)
+    return fig
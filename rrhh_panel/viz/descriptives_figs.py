@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import numpy as np
 import plotly.express as px
+import plotly.graph_objects as go
 from rrhh_panel.viz.labels import apply_bar_labels
 
 def fig_exit_share(dshare, title: str, show_labels: bool):
@@ -30,3 +32,31 @@ def fig_exit_share(dshare, title: str, show_labels: bool):
     )
     figx = apply_bar_labels(figx, show_labels, orientation="h")
     return figx
+
+def fig_retention_heatmap(df_ret, df_act, show_labels: bool) -> go.Figure:
+    cols = [c for c in df_ret.columns if c.startswith("M")]
+    z = df_ret[cols].to_numpy(dtype=float)
+    fig = go.Figure(go.Heatmap(
+        z=z,
+        x=[c[1:] for c in cols],
+        y=df_ret["Cohorte"].astype(str),
+        colorscale="RdYlGn",
+        zmin=0,
+        zmax=1,
+        customdata=np.dstack([
+            df_act[cols].to_numpy(dtype=float),
+            np.repeat(df_ret[["Ingresos"]].to_numpy(dtype=float), len(cols), axis=1),
+        ]),
+        texttemplate="%{z:.0%}" if show_labels else None,
+        hovertemplate=(
+            "<b>Cohorte</b>: %{y}<br>"
+            "<b>Meses desde ingreso</b>: %{x}<br>"
+            "<b>Retención</b>: %{z:.1%}<br>"
+            "<b>Activos</b>: %{customdata[0]:.0f} de %{customdata[1]:.0f}<extra></extra>"
+        ),
+        colorbar=dict(tickformat=".0%"),
+    ))
+    fig.update_layout(title="Retención por cohorte de ingreso (% activos a m meses del ingreso)")
+    fig.update_xaxes(title_text="Meses desde el ingreso")
+    fig.update_yaxes(title_text="Cohorte (mes de ingreso)", autorange="reversed", type="category")
+    return fig